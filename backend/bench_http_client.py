@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Benchmark per-call vs shared pooled httpx clients against the stub Routes API.
+
+    python bench_http_client.py --calls 500
+
+The stub is plain HTTP on localhost, so the gap shown is client setup plus TCP
+connect per call; against the real API each fresh client also pays a TLS
+handshake, so the difference there is larger.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from stub_routes_server import serve_stub_routes
+from utils.http_client import build_http_client
+
+BODY = {
+    "origin": {"location": {"latLng": {"latitude": 40.7484, "longitude": -73.9857}}},
+    "destination": {
+        "location": {"latLng": {"latitude": 40.7580, "longitude": -73.9855}}
+    },
+    "travelMode": "DRIVE",
+}
+
+
+async def _per_call_client(url: str) -> None:
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.post(url, json=BODY)
+        response.raise_for_status()
+
+
+async def _shared_client(client: httpx.AsyncClient, url: str) -> None:
+    response = await client.post(url, json=BODY)
+    response.raise_for_status()
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[int(0.95 * (len(samples_ms) - 1))]
+    print(
+        f"{name:<18} mean {statistics.mean(samples_ms):7.3f} ms  "
+        f"p50 {statistics.median(samples_ms):7.3f} ms  p95 {p95:7.3f} ms"
+    )
+
+
+async def main(calls: int, warmup: int) -> None:
+    async with serve_stub_routes() as server:
+        url = f"{server.base_url}/directions/v2:computeRoutes"
+
+        for _ in range(warmup):
+            await _per_call_client(url)
+        per_call = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            await _per_call_client(url)
+            per_call.append(time.perf_counter() - start)
+
+        client = build_http_client()
+        try:
+            for _ in range(warmup):
+                await _shared_client(client, url)
+            shared = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                await _shared_client(client, url)
+                shared.append(time.perf_counter() - start)
+        finally:
+            await client.aclose()
+
+    print(f"{calls} sequential computeRoutes calls against {server.base_url}")
+    _report("per-call client", per_call)
+    _report("shared pooled", shared)
+    print(
+        f"speedup (mean)     {statistics.mean(per_call) / statistics.mean(shared):.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.warmup))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Convert an OSM XML extract into the compact .npz road graph used by road_graph.py.
+
+    python build_road_graph.py pittsburgh.osm road_graph.npz
+    ROAD_GRAPH_PATH=road_graph.npz ROUTING_BACKEND=local python main.py
+
+Get an extract from e.g. https://extract.bbbike.org or the Overpass API
+(`way[highway](bbox); (._;>;); out;`); .osm.pbf files need converting to XML
+first (osmium cat city.osm.pbf -o city.osm).
+"""
+
+import argparse
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from road_graph import RoadGraph
+from utils.geo import haversine_km
+
+# Free-flow speeds (km/h) used when a way has no usable maxspeed tag
+DEFAULT_SPEEDS_KMH = {
+    "motorway": 100,
+    "motorway_link": 60,
+    "trunk": 80,
+    "trunk_link": 50,
+    "primary": 60,
+    "primary_link": 45,
+    "secondary": 50,
+    "secondary_link": 40,
+    "tertiary": 40,
+    "tertiary_link": 35,
+    "unclassified": 30,
+    "residential": 25,
+    "living_street": 10,
+    "service": 15,
+}
+
+MPH_TO_KMH = 1.609344
+
+
+def _parse_maxspeed(value: str | None) -> float | None:
+    if not value:
+        return None
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", value)
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * MPH_TO_KMH if match.group(2) else speed
+
+
+def build_road_graph(osm_path: str) -> RoadGraph:
+    coords: dict[str, tuple[float, float]] = {}
+    ways: list[tuple[list[str], float, int]] = []
+
+    for _, elem in ET.iterparse(osm_path, events=("end",)):
+        if elem.tag == "node":
+            coords[elem.get("id")] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+            highway = tags.get("highway")
+            if highway in DEFAULT_SPEEDS_KMH and tags.get("access") not in ("no", "private"):
+                speed = _parse_maxspeed(tags.get("maxspeed")) or DEFAULT_SPEEDS_KMH[highway]
+                oneway = tags.get("oneway")
+                if oneway in ("yes", "true", "1") or tags.get("junction") == "roundabout":
+                    direction = 1
+                elif oneway == "-1":
+                    direction = -1
+                else:
+                    direction = 0
+                refs = [nd.get("ref") for nd in elem.iter("nd")]
+                ways.append((refs, speed, direction))
+            elem.clear()
+
+    # Keep only nodes that are part of a drivable way, renumbered densely
+    index: dict[str, int] = {}
+    sources: list[int] = []
+    targets: list[int] = []
+    speeds: list[float] = []
+    for refs, speed, direction in ways:
+        refs = [ref for ref in refs if ref in coords]
+        for a, b in zip(refs, refs[1:]):
+            u = index.setdefault(a, len(index))
+            v = index.setdefault(b, len(index))
+            if direction >= 0:
+                sources.append(u)
+                targets.append(v)
+                speeds.append(speed)
+            if direction <= 0:
+                sources.append(v)
+                targets.append(u)
+                speeds.append(speed)
+
+    node_lat = np.empty(len(index))
+    node_lng = np.empty(len(index))
+    for ref, i in index.items():
+        node_lat[i], node_lng[i] = coords[ref]
+
+    src = np.asarray(sources, dtype=np.int64)
+    dst = np.asarray(targets, dtype=np.int64)
+    lengths_km = haversine_km(node_lat[src], node_lng[src], node_lat[dst], node_lng[dst])
+    travel_s = lengths_km / np.asarray(speeds) * 3600
+
+    edges = list(zip(sources, targets, travel_s.tolist()))
+    return RoadGraph.from_edges(node_lat.tolist(), node_lng.tolist(), edges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("osm_path", help="OSM XML extract (.osm)")
+    parser.add_argument("output_path", help="Output graph (.npz)")
+    args = parser.parse_args()
+
+    graph = build_road_graph(args.osm_path)
+    graph.save(args.output_path)
+    print(
+        f"Wrote {args.output_path}: {graph.node_count} nodes, {graph.edge_count} edges, "
+        f"max speed {graph.max_speed_kmh:.0f} km/h"
+    )
@@ -12,93 +12,276 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from models import Ambulance, AmbulanceStatus, Event, PydanticObjectId
 
 
+import os
 from datetime import datetime
-from models import Ambulance, AmbulanceStatus
-from maps_call import compute_route_eta_and_path
-from routes.cameras import calculate_distance
+import numpy as np
+from beanie.operators import In
+from models import Ambulance, AmbulanceStatus, EventStatus
+from maps_call import compute_route_eta_and_path, compute_route_matrix
+from utils.assignment import linear_sum_assignment
+from utils.geo import distance_matrix
+from utils.live_ws import broadcast_all
+from utils.motion import plan_route
+from utils.spatial_index import ambulance_index, geo_near
 
+# How many straight-line-nearest idle units to price by routed ETA
+DISPATCH_CANDIDATES = int(os.getenv("DISPATCH_CANDIDATES", "5"))
+DISPATCH_ROUTE_CONCURRENCY = int(os.getenv("DISPATCH_ROUTE_CONCURRENCY", "5"))
+DISPATCH_ROUTE_DEADLINE_S = float(os.getenv("DISPATCH_ROUTE_DEADLINE_S", "3.0"))
 
-async def get_ambulance_and_path(event_id: PydanticObjectId):
+
+def estimate_eta_seconds(distance_km: float) -> int:
+    """Straight-line ETA assuming 60 km/h average speed."""
+    return int((distance_km / 60) * 3600)
+
+
+def _to_points(path: list[tuple[float, float]] | None) -> list[Point] | None:
+    return [Point(lat=lat, lng=lng) for lat, lng in path] if path else None
+
+
+async def _route_pairs(
+    pairs: list[tuple[float, float, float, float]],
+) -> list[tuple[int | None, list[Point] | None]]:
+    """Query routes for (origin_lat, origin_lng, dest_lat, dest_lng) pairs
+    concurrently under a cap and a deadline.
+
+    Pairs whose route fails or misses the deadline come back as (None, None).
     """
-    Find the nearest idle ambulance, compute ETA and path, and
-    atomically mark it as ENROUTE with ETA and timestamp.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DISPATCH_ROUTE_DEADLINE_S
+    semaphore = asyncio.Semaphore(DISPATCH_ROUTE_CONCURRENCY)
+
+    async def route(pair: tuple[float, float, float, float]):
+        async with semaphore:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None, None
+            return await asyncio.wait_for(
+                compute_route_eta_and_path(*pair), remaining
+            )
+
+    results = await asyncio.gather(
+        *(route(pair) for pair in pairs), return_exceptions=True
+    )
+
+    routed = []
+    for pair, result in zip(pairs, results):
+        if isinstance(result, BaseException):
+            print(f"Error computing route {pair}: {result!r}")
+            routed.append((None, None))
+            continue
+        eta, path = result
+        routed.append((eta, _to_points(path)))
+    return routed
+
+
+async def _price_matrix(ambulances: list[Ambulance], events: list[Event]) -> np.ndarray:
+    """(ambulances x events) ETA seconds from one route matrix round-trip.
+
+    Pairs without a routed ETA get the straight-line estimate.
     """
-    event = await Event.get(event_id)
+    try:
+        etas = await asyncio.wait_for(
+            compute_route_matrix(
+                [(amb.lat, amb.lng) for amb in ambulances],
+                [(event.lat, event.lng) for event in events],
+            ),
+            DISPATCH_ROUTE_DEADLINE_S,
+        )
+    except asyncio.TimeoutError:
+        print("Route matrix timed out.")
+        etas = [[None] * len(events) for _ in ambulances]
 
-    if not event:
-        print(f"Event {event_id} not found.")
-        return None, None, None
-    event_lat = event.lat
-    event_lng = event.lng
+    routed = np.array(
+        [[np.nan if eta is None else eta for eta in row] for row in etas],
+        dtype=float,
+    ).reshape(len(ambulances), len(events))
+    straight_km = distance_matrix(
+        [amb.lat for amb in ambulances],
+        [amb.lng for amb in ambulances],
+        [event.lat for event in events],
+        [event.lng for event in events],
+    )
+    return np.where(np.isnan(routed), straight_km / 60 * 3600, routed)
+
+
+async def _idle_pool(events: list[Event]) -> list[Ambulance]:
+    """The union of each event's K nearest idle ambulances.
+
+    Read from the in-memory index; when it has no idle unit that is still
+    idle in MongoDB (not loaded, or out of date), from $geoNear instead.
+    """
+    pool_ids = {
+        ambulance_id
+        for event in events
+        for ambulance_id, _ in ambulance_index.nearest_idle(
+            event.lat, event.lng, k=DISPATCH_CANDIDATES
+        )
+    }
+    ambulances = []
+    if pool_ids:
+        ambulances = await Ambulance.find(
+            In(Ambulance.id, list(pool_ids)), Ambulance.status == AmbulanceStatus.IDLE
+        ).to_list()
+        for ambulance_id in pool_ids - {amb.id for amb in ambulances}:
+            ambulance_index.discard(ambulance_id)
+    if ambulances:
+        return ambulances
 
-    ambulances = await Ambulance.find({"status": AmbulanceStatus.IDLE}).to_list()
-    print(ambulances)
+    nearest = await asyncio.gather(
+        *(
+            geo_near(
+                Ambulance,
+                event.lat,
+                event.lng,
+                DISPATCH_CANDIDATES,
+                {"status": AmbulanceStatus.IDLE.value},
+            )
+            for event in events
+        )
+    )
+    pool = {amb.id: amb for found in nearest for amb, _ in found}
+    for ambulance in pool.values():
+        ambulance_index.update(ambulance)
+    return list(pool.values())
+
+
+async def assign_events(
+    event_ids: list[PydanticObjectId],
+) -> dict[PydanticObjectId, tuple[Ambulance, int, list[Point] | None]]:
+    """
+    Jointly assign idle ambulances to open events, minimizing total ETA.
+
+    Candidates are the union of each event's K nearest idle units. They are
+    priced against every event in one matrix and matched with the Hungarian
+    algorithm. All claims then go out in one bulk write, and all event
+    updates in another. Returns {event_id: (ambulance, eta, path)} for the
+    events that got a unit.
+    """
+    events = await Event.find(
+        In(Event.id, event_ids), Event.status == EventStatus.OPEN
+    ).to_list()
+    if not events:
+        return {}
+
+    ambulances = await _idle_pool(events)
     if not ambulances:
         print("No idle ambulances found.")
-        return None, None, None
+        return {}
 
-    best_ambulance = None
-    best_eta = float("inf")
-    best_path = None
+    cost = await _price_matrix(ambulances, events)
+    rows, cols = linear_sum_assignment(cost)
+    pairs = [(ambulances[r], events[c], int(cost[r, c])) for r, c in zip(rows, cols)]
 
-    min = float("inf")
+    # Paths only for the chosen pairs (usually route cache hits)
+    paths = await _route_pairs(
+        [(amb.lat, amb.lng, event.lat, event.lng) for amb, event, _ in pairs]
+    )
 
-    # Find closes ambulace
-    for amb in ambulances:
-        distance = calculate_distance(event_lat, event_lng, amb.lat, amb.lng)
-        if distance < min:
-            min = distance
-            best_ambulance = amb
+    # A unit without a routed path drives a straight leg, so it still arrives
+    paths = [
+        path or [Point(lat=amb.lat, lng=amb.lng), Point(lat=event.lat, lng=event.lng)]
+        for (amb, event, _), (_, path) in zip(pairs, paths)
+    ]
 
-    print(f"Closest ambulance is {best_ambulance.id} at distance {min} km")
+    now = datetime.utcnow()
+    ambulance_writer = Ambulance.bulk_writer(ordered=False)
+    for (amb, event, eta), path in zip(pairs, paths):
+        await Ambulance.find_one(
+            {"_id": amb.id, "status": AmbulanceStatus.IDLE}
+        ).update(
+            {
+                "$set": {
+                    "status": AmbulanceStatus.ENROUTE,
+                    "event_id": event.id,
+                    "eta_seconds": eta,
+                    "updated_at": now,
+                    **plan_route(path, eta, now),
+                }
+            },
+            bulk_writer=ambulance_writer,
+        )
+    await ambulance_writer.commit()
 
-    # Run API to find ETA and path for the closest ambulance
-    try:
-        eta, path = await compute_route_eta_and_path(
-            best_ambulance.lat, best_ambulance.lng, event_lat, event_lng
+    # Reload to see which claims won; a unit may have been taken elsewhere
+    claimed = {
+        amb.id: amb
+        for amb in await Ambulance.find(
+            In(Ambulance.id, [amb.id for amb, _, _ in pairs])
+        ).to_list()
+    }
+    results = {}
+    event_writer = Event.bulk_writer(ordered=False)
+    for (amb, event, eta), path in zip(pairs, paths):
+        current = claimed.get(amb.id)
+        if current is None:
+            ambulance_index.discard(amb.id)
+            continue
+        ambulance_index.update(current)
+        if current.event_id != event.id:
+            print(f"Ambulance {amb.id} was already taken.")
+            continue
+        await Event.find_one({"_id": event.id, "status": EventStatus.OPEN}).update(
+            {
+                "$set": {
+                    "ambulance_id": amb.id,
+                    "status": EventStatus.ENROUTE,
+                    "dispatched_at": now,
+                }
+            },
+            bulk_writer=event_writer,
         )
-        if eta is not None and eta < best_eta:
-            best_eta = eta
-            best_path = path
-    except Exception as e:
-        print(f"Error computing route for best ambulance {best_ambulance.id}: {e}")
-        try:
-            eta, path = await compute_route_eta_and_path(
-                amb.lat, amb.lng, event_lat, event_lng
-            )
-            if eta is not None and eta < best_eta:
-                best_eta = eta
-                best_ambulance = amb
-                best_path = [Point(lat=pt[0], lng=pt[1]) for pt in path]
-        except Exception as e:
-            print(f"Error computing route for ambulance {amb.id}: {e}")
-
-    if best_ambulance is None:
-        return None, None, None
-
-    # Atomically update the ambulance in MongoDB
-    updated = await Ambulance.find_one(
-        {"_id": best_ambulance.id, "status": AmbulanceStatus.IDLE}
-    ).update(
-        {
-            "$set": {
-                "status": AmbulanceStatus.ENROUTE,
-                "event_id": event_id,
-                "eta_seconds": best_eta,
-                "updated_at": datetime.utcnow(),
+        print(f"Dispatching ambulance {amb.id} to event {event.id} with ETA {eta}s")
+        results[event.id] = (current, eta, path)
+    written = await event_writer.commit()
+    if written is not None and written.matched_count < len(results):
+        await _release_lost_claims(results)
+    return results
+
+
+async def _release_lost_claims(
+    results: dict[PydanticObjectId, tuple[Ambulance, int, list[Point] | None]],
+) -> None:
+    """Put units back to IDLE whose event was resolved or taken meanwhile.
+
+    Drops those events from results.
+    """
+    events = await Event.find(In(Event.id, list(results))).to_list()
+    assigned = {event.id: event.ambulance_id for event in events}
+    released = []
+    for event_id, (amb, _, _) in list(results.items()):
+        if assigned.get(event_id) == amb.id:
+            continue
+        print(f"Event {event_id} changed before dispatch; releasing ambulance {amb.id}.")
+        del results[event_id]
+        released.append(amb.id)
+        await Ambulance.find_one(
+            {"_id": amb.id, "status": AmbulanceStatus.ENROUTE, "event_id": event_id}
+        ).update(
+            {
+                "$set": {
+                    "status": AmbulanceStatus.IDLE,
+                    "event_id": None,
+                    "eta_seconds": None,
+                    "updated_at": datetime.utcnow(),
+                    **plan_route(None, None, datetime.utcnow()),
+                }
             }
-        }
-    )
+        )
+        current = await Ambulance.get(amb.id)
+        if current is not None:
+            ambulance_index.update(current)
+    broadcast_all("ambulances", released)
 
-    if updated.matched_count == 0:
-        # Another process grabbed it first
-        print("Ambulance was already taken.")
-        return None, None, None
 
-    # Return the updated ambulance info, ETA, and path
-    # Reload the ambulance document if you need all fields
-    best_ambulance = await Ambulance.get(best_ambulance.id)
-    return best_ambulance, best_eta, best_path
+async def get_ambulance_and_path(event_id: PydanticObjectId):
+    """Dispatch a single event through assign_events.
+
+    Returns (ambulance, eta_seconds, path), or (None, None, None) when no
+    unit could be assigned.
+    """
+    results = await assign_events([event_id])
+    return results.get(event_id, (None, None, None))
 
 
 async def main():
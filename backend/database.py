@@ -33,12 +33,14 @@ async def init_db():
         # Test connection first
         await client.admin.command("ping")
 
-        from models import Camera, Event, Ambulance, Hospital
+        from models import Camera, Event, Ambulance, Hospital, backfill_derived_fields
 
+        # Creates the indexes declared in each model's Settings
         await init_beanie(
             database=client[MONGODB_DATABASE_NAME],
             document_models=[Camera, Event, Ambulance, Hospital],
         )
+        await backfill_derived_fields()
 
         print(f"✅ Connected to MongoDB: {MONGODB_DATABASE_NAME}")
     except Exception as e:
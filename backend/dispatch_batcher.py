@@ -0,0 +1,247 @@
+import asyncio
+import heapq
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+
+from choose_ambulance import assign_events
+from models import Ambulance, AmbulanceStatus, Event, EventStatus, Severity
+from schemas import Point
+from utils.jobs import job_runner
+from utils.live_ws import broadcast_all
+from utils.spatial_index import ambulance_index
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_BATCH_WINDOW_MS = int(os.getenv("DISPATCH_BATCH_WINDOW_MS", "200"))
+
+DispatchResult = tuple[Optional[Ambulance], Optional[int], Optional[list[Point]]]
+
+# Lower dispatches first
+SEVERITY_PRIORITY = {Severity.EMERGENCY: 0, Severity.INFORMATIONAL: 1}
+
+
+@dataclass(order=True)
+class PendingDispatch:
+    priority: int
+    created_at: datetime
+    seq: int
+    event_id: PydanticObjectId = field(compare=False)
+    simulate: bool = field(compare=False, default=False)
+
+
+class PendingDispatchQueue:
+    """Events waiting for a free unit: most severe first, then oldest first."""
+
+    def __init__(self) -> None:
+        self._heap: list[PendingDispatch] = []
+        self._entries: dict[PydanticObjectId, PendingDispatch] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, event_id: PydanticObjectId) -> bool:
+        return event_id in self._entries
+
+    def push(self, event: Event, simulate: bool = False) -> None:
+        if event.id in self._entries:
+            return
+        self._seq += 1
+        created_at = event.created_at.replace(tzinfo=None)
+        entry = PendingDispatch(
+            SEVERITY_PRIORITY.get(event.severity, len(SEVERITY_PRIORITY)),
+            created_at,
+            self._seq,
+            event.id,
+            simulate,
+        )
+        self._entries[event.id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def requeue(self, entry: PendingDispatch) -> None:
+        """Put a popped entry back with its original priority and age."""
+        if entry.event_id in self._entries:
+            return
+        self._entries[entry.event_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def pop(self, n: int) -> list[PendingDispatch]:
+        """Remove and return up to n entries in dispatch order."""
+        popped = []
+        while self._heap and len(popped) < n:
+            entry = heapq.heappop(self._heap)
+            # Skip entries superseded by discard() or requeue()
+            if self._entries.get(entry.event_id) is entry:
+                del self._entries[entry.event_id]
+                popped.append(entry)
+        return popped
+
+    def discard(self, event_id: PydanticObjectId) -> None:
+        self._entries.pop(event_id, None)
+
+
+class DispatchBatcher:
+    """Collects emergency events over a short window and dispatches them jointly.
+
+    The first submission opens a window. When it closes, every event submitted
+    in it is assigned in one optimization by choose_ambulance.assign_events.
+    Batches run one at a time, so they never compete for the same units.
+
+    Events left without a unit wait in a PendingDispatchQueue (backlog). The
+    backlog is re-evaluated as soon as notify_unit_available() reports a
+    freed unit.
+    """
+
+    def __init__(self, window_ms: int = DISPATCH_BATCH_WINDOW_MS) -> None:
+        self.window_s = window_ms / 1000
+        self.backlog = PendingDispatchQueue()
+        self._pending: dict[PydanticObjectId, tuple[asyncio.Future, bool]] = {}
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def submit(
+        self, event_id: PydanticObjectId, simulate: bool = False
+    ) -> DispatchResult:
+        """Queue an event for the next batch and wait for its assignment.
+
+        Returns (ambulance, eta_seconds, path), or (None, None, None) when no
+        unit is free; the event then waits in the backlog. With simulate=True
+        a unit assigned later from the backlog is also started on its route.
+        """
+        pending = self._pending.get(event_id)
+        if pending is None:
+            if not self._pending:
+                self._spawn(self._flush_after_window())
+            pending = (asyncio.get_running_loop().create_future(), simulate)
+            self._pending[event_id] = pending
+        # Shielded: a cancelled request must not cancel the shared future
+        return await asyncio.shield(pending[0])
+
+    def notify_unit_available(self) -> None:
+        """A unit became idle: re-evaluate the backlog right away.
+
+        Not during shutdown: assigned units could no longer be simulated,
+        and load_backlog picks the waiting events up after the restart.
+        """
+        if len(self.backlog) and not job_runner.closing:
+            self._spawn(self._drain_backlog())
+
+    async def load_backlog(self) -> None:
+        """Queue open emergencies that never got a unit (e.g. before a restart)."""
+        events = await Event.find(
+            Event.status == EventStatus.OPEN,
+            Event.severity == Severity.EMERGENCY,
+            Event.ambulance_id == None,  # noqa: E711
+        ).to_list()
+        for event in events:
+            self.backlog.push(event, simulate=True)
+        if events:
+            logger.info("Dispatch backlog loaded with %s events", len(events))
+            self.notify_unit_available()
+
+    async def _still_open(self, event_ids: list[PydanticObjectId]) -> list[Event]:
+        if not event_ids:
+            return []
+        return await Event.find(
+            In(Event.id, event_ids), Event.status == EventStatus.OPEN
+        ).to_list()
+
+    def _broadcast_results(
+        self, results: dict[PydanticObjectId, DispatchResult]
+    ) -> None:
+        broadcast_all(
+            "ambulances", [ambulance.id for ambulance, _, _ in results.values()]
+        )
+        broadcast_all("events", list(results))
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window_s)
+        batch, self._pending = self._pending, {}
+
+        async with self._lock:
+            try:
+                results = await assign_events(list(batch))
+            except Exception as e:
+                logger.exception("Dispatch batch of %s events failed", len(batch))
+                for future, _ in batch.values():
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            unassigned = [event_id for event_id in batch if event_id not in results]
+            for event in await self._still_open(unassigned):
+                self.backlog.push(event, simulate=batch[event.id][1])
+
+        # A unit freed while this batch ran saw an empty backlog and did not
+        # drain it; the drain itself checks for idle units
+        if len(self.backlog):
+            self.notify_unit_available()
+
+        logger.info(
+            "Dispatch batch: %s/%s events assigned, %s in backlog",
+            len(results),
+            len(batch),
+            len(self.backlog),
+        )
+        if results:
+            self._broadcast_results(results)
+
+        for event_id, (future, _) in batch.items():
+            if not future.done():
+                future.set_result(results.get(event_id, (None, None, None)))
+
+    async def _drain_backlog(self) -> None:
+        async with self._lock:
+            if job_runner.closing:
+                return
+            # Highest-priority events first, at most one per idle unit
+            idle = len(ambulance_index)
+            if not idle:
+                # Index not loaded or out of date: count in MongoDB
+                idle = await Ambulance.find(
+                    Ambulance.status == AmbulanceStatus.IDLE
+                ).count()
+            entries = self.backlog.pop(idle)
+            if not entries:
+                return
+            try:
+                results = await assign_events([entry.event_id for entry in entries])
+            except Exception:
+                logger.exception("Backlog dispatch failed")
+                results = {}
+
+            waiting = {e.event_id: e for e in entries if e.event_id not in results}
+            for event in await self._still_open(list(waiting)):
+                self.backlog.requeue(waiting[event.id])
+
+        logger.info(
+            "Backlog dispatch: %s/%s events assigned, %s still waiting",
+            len(results),
+            len(entries),
+            len(self.backlog),
+        )
+        if not results:
+            return
+        self._broadcast_results(results)
+
+        # Imported here: utils.ambulance notifies this module when units free up
+        from utils.ambulance import submit_simulation
+
+        for entry in entries:
+            if entry.event_id in results and entry.simulate:
+                ambulance, _, _ = results[entry.event_id]
+                submit_simulation(ambulance.id, replace=True)
+
+
+dispatch_batcher = DispatchBatcher()
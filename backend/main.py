@@ -6,8 +6,17 @@ import logging
 import asyncio
 
 from database import init_db
+from dispatch_batcher import dispatch_batcher
 from seed_data import seed_data
+from road_graph import load_road_graph
 from routes import api_router
+from utils.http_client import close_http_client, init_http_client
+from utils.jobs import job_runner
+from utils.live_bus import live_bus
+from utils.route_cache import route_cache
+from utils.simulation import simulation_engine
+from utils.spatial_index import ambulance_index
+from utils.state_cache import state_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,8 +29,26 @@ async def lifespan(_app: FastAPI):
     # Startup
     logger.info("🚀 Starting Lifeline...")
     await init_db()
+    await init_http_client()
+    route_cache.load()
+    load_road_graph()
+    await live_bus.start()
+    try:
+        await state_cache.load()
+        await ambulance_index.load()
+        await dispatch_batcher.load_backlog()
+    except Exception as e:
+        logger.warning("Dispatch state not loaded: %s", e)
     yield
     logger.info("👋 Shutting down...")
+    logger.info("Route cache stats: %s", route_cache.stats())
+    route_cache.save()
+    # Before the engine: cancelled simulations leave the tick loop cleanly
+    await job_runner.close()
+    await simulation_engine.close()
+    await live_bus.close()
+    await state_cache.close()
+    await close_http_client()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -36,6 +63,8 @@ app.add_middleware(
     ],  # React dev server origins
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursor of GET /events
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router)
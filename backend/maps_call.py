@@ -1,14 +1,27 @@
+import asyncio
 import os
 from datetime import datetime
 from dotenv import load_dotenv
-import httpx
 import polyline  # pip install polyline
 
+from road_graph import get_road_graph
+from utils.http_client import get_http_client
+from utils.route_cache import route_cache
+
 load_dotenv()
 
 API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 
-URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
+# "google": Routes API only; "local": offline road graph only (ROAD_GRAPH_PATH);
+# "auto": Routes API, with the road graph (if loaded) filling in failures
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "auto").lower()
+
+# Overridable so dispatch can be pointed at a local stand-in (stub_routes_server.py)
+ROUTES_API_BASE_URL = os.getenv(
+    "ROUTES_API_BASE_URL", "https://routes.googleapis.com"
+).rstrip("/")
+
+URL = f"{ROUTES_API_BASE_URL}/directions/v2:computeRoutes"
 
 # Updated FieldMask to include polyline and removed trailing comma
 HEADERS = {
@@ -17,6 +30,19 @@ HEADERS = {
     "X-Goog-FieldMask": "routes.duration,routes.polyline.encodedPolyline",
 }
 
+MATRIX_URL = f"{ROUTES_API_BASE_URL}/distanceMatrix/v2:computeRouteMatrix"
+
+MATRIX_HEADERS = {
+    "Content-Type": "application/json",
+    "X-Goog-Api-Key": API_KEY,
+    "X-Goog-FieldMask": "originIndex,destinationIndex,duration,condition",
+}
+
+# Routes API cap on origins x destinations per TRAFFIC_AWARE matrix request
+ROUTE_MATRIX_MAX_ELEMENTS = int(os.getenv("ROUTE_MATRIX_MAX_ELEMENTS", "100"))
+
+LatLng = tuple[float, float]
+
 
 async def compute_route_eta_and_path(
     origin_lat: float,
@@ -28,7 +54,45 @@ async def compute_route_eta_and_path(
     Returns:
         eta_seconds: int or None
         path: list of (lat, lng) points from origin to destination, or None on failure
+
+    Served from the route cache when a fresh route between the same grid
+    cells is known; only successful lookups are cached. See ROUTING_BACKEND
+    for when the offline road graph is used instead. Graph searches run in
+    a worker thread so they never block the event loop.
     """
+    graph = get_road_graph() if ROUTING_BACKEND in ("local", "auto") else None
+    if ROUTING_BACKEND == "local" and graph is None:
+        return None, None
+
+    cached = route_cache.get(origin_lat, origin_lng, dest_lat, dest_lng)
+    if cached is not None:
+        return cached
+
+    if ROUTING_BACKEND == "local":
+        eta_seconds, path = await asyncio.to_thread(
+            graph.route, origin_lat, origin_lng, dest_lat, dest_lng
+        )
+    else:
+        eta_seconds, path = await _request_route(
+            origin_lat, origin_lng, dest_lat, dest_lng
+        )
+        if eta_seconds is None and graph is not None:
+            # Not cached: the Routes API is asked again next time
+            return await asyncio.to_thread(
+                graph.route, origin_lat, origin_lng, dest_lat, dest_lng
+            )
+    if eta_seconds is not None:
+        route_cache.put(origin_lat, origin_lng, dest_lat, dest_lng, eta_seconds, path)
+    return eta_seconds, path
+
+
+async def _request_route(
+    origin_lat: float,
+    origin_lng: float,
+    dest_lat: float,
+    dest_lng: float,
+) -> tuple[int | None, list[tuple[float, float]] | None]:
+    """Call the Routes API for a single origin/destination pair."""
 
     body = {
         "origin": {
@@ -43,10 +107,9 @@ async def compute_route_eta_and_path(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(URL, headers=HEADERS, json=body)
-            response.raise_for_status()
-            data = response.json()
+        response = await get_http_client().post(URL, headers=HEADERS, json=body)
+        response.raise_for_status()
+        data = response.json()
 
         routes = data.get("routes")
         if not routes:
@@ -67,3 +130,127 @@ async def compute_route_eta_and_path(
     except Exception as e:
         print(f"Error calling Routes API: {e}")
         return None, None
+
+
+def _matrix_waypoint(lat: float, lng: float) -> dict:
+    return {"waypoint": {"location": {"latLng": {"latitude": lat, "longitude": lng}}}}
+
+
+async def compute_route_matrix(
+    origins: list[LatLng],
+    destinations: list[LatLng],
+) -> list[list[int | None]]:
+    """
+    Returns:
+        etas[i][j]: ETA in seconds from origins[i] to destinations[j], or None
+        where no route exists or the request failed
+
+    Pairs already in the route cache are filled from it. The rest are
+    priced with computeRouteMatrix, split into blocks of at most
+    ROUTE_MATRIX_MAX_ELEMENTS pairs that are sent concurrently. See
+    ROUTING_BACKEND for when the offline road graph is used instead.
+    """
+    graph = get_road_graph() if ROUTING_BACKEND in ("local", "auto") else None
+    etas: list[list[int | None]] = [[None] * len(destinations) for _ in origins]
+    if ROUTING_BACKEND == "local" and graph is None:
+        return etas
+
+    for i, (origin_lat, origin_lng) in enumerate(origins):
+        for j, (dest_lat, dest_lng) in enumerate(destinations):
+            cached = route_cache.get(
+                origin_lat, origin_lng, dest_lat, dest_lng, count=False
+            )
+            if cached is not None:
+                etas[i][j] = cached[0]
+
+    pending_rows = [i for i, row in enumerate(etas) if None in row]
+    # One lookup per matrix: a hit only when no request is needed
+    route_cache.count_lookup(not pending_rows)
+    if not pending_rows:
+        return etas
+    if ROUTING_BACKEND == "local":
+        return await _fill_from_graph(graph, etas, pending_rows, origins, destinations)
+
+    cols_per_block = max(1, min(len(destinations), ROUTE_MATRIX_MAX_ELEMENTS))
+    rows_per_block = max(1, ROUTE_MATRIX_MAX_ELEMENTS // cols_per_block)
+    blocks = [
+        (
+            pending_rows[r : r + rows_per_block],
+            list(range(c, min(c + cols_per_block, len(destinations)))),
+        )
+        for r in range(0, len(pending_rows), rows_per_block)
+        for c in range(0, len(destinations), cols_per_block)
+    ]
+    results = await asyncio.gather(
+        *(
+            _request_route_matrix(
+                [origins[i] for i in rows], [destinations[j] for j in cols]
+            )
+            for rows, cols in blocks
+        )
+    )
+
+    for (rows, cols), block in zip(blocks, results):
+        for bi, i in enumerate(rows):
+            for bj, j in enumerate(cols):
+                if etas[i][j] is None:
+                    etas[i][j] = block[bi][bj]
+
+    missing_rows = [i for i, row in enumerate(etas) if None in row]
+    if graph is not None and missing_rows:
+        return await _fill_from_graph(graph, etas, missing_rows, origins, destinations)
+    return etas
+
+
+async def _fill_from_graph(
+    graph,
+    etas: list[list[int | None]],
+    rows: list[int],
+    origins: list[LatLng],
+    destinations: list[LatLng],
+) -> list[list[int | None]]:
+    """Fill the gaps in etas[rows] from the road graph, in a worker thread."""
+    local = await asyncio.to_thread(
+        graph.route_matrix, [origins[i] for i in rows], destinations
+    )
+    for i, row in zip(rows, local):
+        etas[i] = [eta if eta is not None else alt for eta, alt in zip(etas[i], row)]
+    return etas
+
+
+async def _request_route_matrix(
+    origins: list[LatLng],
+    destinations: list[LatLng],
+) -> list[list[int | None]]:
+    """Call computeRouteMatrix for one block of origins x destinations."""
+    etas: list[list[int | None]] = [[None] * len(destinations) for _ in origins]
+
+    body = {
+        "origins": [_matrix_waypoint(lat, lng) for lat, lng in origins],
+        "destinations": [_matrix_waypoint(lat, lng) for lat, lng in destinations],
+        "travelMode": "DRIVE",
+        "routingPreference": "TRAFFIC_AWARE",
+    }
+
+    try:
+        response = await get_http_client().post(
+            MATRIX_URL, headers=MATRIX_HEADERS, json=body
+        )
+        response.raise_for_status()
+        elements = response.json()
+
+        for element in elements:
+            if element.get("condition") != "ROUTE_EXISTS":
+                continue
+            duration_str = element.get("duration")
+            if not duration_str:
+                continue
+            # Zero indices are omitted from the JSON response
+            i = element.get("originIndex", 0)
+            j = element.get("destinationIndex", 0)
+            etas[i][j] = int(duration_str.rstrip("s"))
+
+    except Exception as e:
+        print(f"Error calling Route Matrix API: {e}")
+
+    return etas
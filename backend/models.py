@@ -1,9 +1,27 @@
-from beanie import Document, PydanticObjectId
-from typing import Optional
+from beanie import (
+    Delete,
+    Document,
+    Insert,
+    PydanticObjectId,
+    Replace,
+    Save,
+    SaveChanges,
+    Update,
+    after_event,
+    before_event,
+)
+from typing import Any, Optional
 from datetime import datetime
 from enum import Enum
+from pydantic import model_validator
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
 
-from schemas import Point
+from schemas import GeoPoint, Point
+from utils.camera_names import camera_names
+from utils.motion import Motion
+from utils.path_codec import decode_path, encode_path
+from utils.spatial_index import ambulance_index
+from utils.state_cache import state_cache
 
 
 class Severity(str, Enum):
@@ -21,20 +39,78 @@ class AmbulanceStatus(str, Enum):
     IDLE = "idle"
     ENROUTE = "enroute"
     UNAVAILABLE = "unavailable"
+    # Driving back after an event; not dispatchable until it is freed
+    RETURNING = "returning"
 
 
-class Camera(Document):
+class CachedDocument(Document):
+    """Keeps utils.state_cache current with every write made through Beanie."""
+
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    def sync_state_cache(self):
+        state_cache.apply(self)
+
+    @after_event(Delete)
+    def drop_from_state_cache(self):
+        state_cache.discard(type(self), self.id)
+
+
+class GeoDocument(CachedDocument):
+    """A cached document with a position, mirrored into a GeoJSON location
+    (2dsphere-indexed) so nearest lookups can run as $geoNear.
+
+    Writes that $set lat/lng directly must set location as well.
+    """
+
     lat: float
     lng: float
+    location: Optional[GeoPoint] = None
+
+    @model_validator(mode="after")
+    def _sync_location(self):
+        self.location = GeoPoint.of(self.lat, self.lng)
+        return self
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def refresh_location(self):
+        self.location = GeoPoint.of(self.lat, self.lng)
+
+
+def camera_name_key(name: Optional[str]) -> Optional[str]:
+    """Case- and separator-insensitive camera name ("Astra-12" == "astra_12")."""
+    return name.lower().replace("-", "_") if name else None
+
+
+class Camera(GeoDocument):
     latest_frame_url: str
     name: Optional[str] = None
+    # camera_name_key(name), indexed for lookups by loosely typed names
+    name_key: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _sync_name_key(self):
+        self.name_key = camera_name_key(self.name)
+        return self
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def refresh_name_key(self):
+        self.name_key = camera_name_key(self.name)
+
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    def invalidate_camera_name(self):
+        camera_names.invalidate(self.id)
 
     class Settings:
         name = "cameras"
         use_cache = False
+        indexes = [
+            IndexModel([("name", ASCENDING)], name="name"),
+            IndexModel([("name_key", ASCENDING)], name="name_key"),
+            IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        ]
 
 
-class Event(Document):
+class Event(CachedDocument):
     severity: Severity
     title: str
     description: str
@@ -50,25 +126,115 @@ class Event(Document):
 
     class Settings:
         name = "events"
-
-
-class Ambulance(Document):
-    lat: float
-    lng: float
+        # Keyset pagination newest first (utils/event_query.py), optionally
+        # within one status
+        indexes = [
+            IndexModel(
+                [("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="created_at_id",
+            ),
+            IndexModel(
+                [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="status_created_at_id",
+            ),
+        ]
+
+
+class Ambulance(GeoDocument):
     status: AmbulanceStatus = AmbulanceStatus.IDLE
     event_id: Optional[PydanticObjectId] = None
     eta_seconds: Optional[int] = None
     updated_at: datetime
-    path: list[Point] | None = None
+    # Simplified encoded polyline of the current route; path_index counts the
+    # points already reached, so the remaining route is path[path_index:]
+    path_encoded: Optional[str] = None
+    path_index: int = 0
+    # Timed route (see utils/motion.py): per path vertex, meters from the
+    # start and planned seconds after departed_at
+    departed_at: Optional[datetime] = None
+    route_cumulative_m: Optional[list[float]] = None
+    route_times_s: Optional[list[float]] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _encode_legacy_path(cls, data: Any) -> Any:
+        # Documents written before paths were encoded store a list of points
+        if isinstance(data, dict) and "path" in data:
+            data = dict(data)
+            legacy = data.pop("path")
+            if legacy and "path_encoded" not in data:
+                data["path_encoded"] = encode_path(
+                    [Point.model_validate(pt) for pt in legacy]
+                )
+        return data
+
+    def decoded_path(self) -> list[Point]:
+        """The full stored route, decoded."""
+        return decode_path(self.path_encoded)
+
+    def remaining_path(self) -> list[Point]:
+        return self.decoded_path()[self.path_index :]
+
+    def motion(self) -> Optional[Motion]:
+        return Motion.of(self)
+
+    def motion_fields(self, at: Optional[datetime] = None) -> dict[str, Any]:
+        """Position, path_index and eta_seconds where the timed route puts the
+        unit at `at` (default now), as serialized fields; empty if it has no
+        timed route. The document itself is left unchanged."""
+        motion = self.motion()
+        if motion is None:
+            return {}
+        state = motion.state(at)
+        return {
+            "lat": state.lat,
+            "lng": state.lng,
+            "location": GeoPoint.of(state.lat, state.lng).model_dump(),
+            "path_index": state.path_index,
+            "eta_seconds": state.eta_seconds,
+        }
+
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    def sync_location_index(self):
+        ambulance_index.update(self)
+
+    @after_event(Delete)
+    def drop_from_location_index(self):
+        ambulance_index.discard(self.id)
 
     class Settings:
         name = "ambulances"
+        indexes = [
+            IndexModel([("status", ASCENDING)], name="status"),
+            # $geoNear over idle units
+            IndexModel(
+                [("location", GEOSPHERE), ("status", ASCENDING)],
+                name="location_2dsphere_status",
+            ),
+        ]
 
 
-class Hospital(Document):
+class Hospital(GeoDocument):
     name: str
-    lat: float
-    lng: float
 
     class Settings:
         name = "hospitals"
+        indexes = [
+            IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        ]
+
+
+async def backfill_derived_fields() -> None:
+    """Fill location and name_key on documents stored before those fields existed."""
+    location = {"type": "Point", "coordinates": ["$lng", "$lat"]}
+    for model in (Camera, Ambulance, Hospital):
+        await model.get_pymongo_collection().update_many(
+            {"location": {"$exists": False}}, [{"$set": {"location": location}}]
+        )
+    name_key = {
+        "$replaceAll": {"input": {"$toLower": "$name"}, "find": "-", "replacement": "_"}
+    }
+    await Camera.get_pymongo_collection().update_many(
+        {"name_key": {"$exists": False}, "name": {"$type": "string"}},
+        [{"$set": {"name_key": name_key}}],
+    )
@@ -0,0 +1,268 @@
+"""Offline road-graph routing: an alternative ETA/path source to the Routes API.
+
+The graph is a compact array-backed adjacency (CSR) stored as an .npz file
+(see build_road_graph.py to convert an OSM extract):
+
+    node_lat, node_lng   float64[N]   node coordinates
+    offsets              int64[N+1]   edges of node u are offsets[u]:offsets[u+1]
+    targets              int32[E]     edge target node
+    travel_s             float32[E]   edge travel time in seconds
+    max_speed_kmh        float64[]    fastest edge speed (keeps A* admissible)
+"""
+
+import heapq
+import logging
+import math
+import os
+from typing import Optional
+
+import numpy as np
+
+from utils.geo import KM_PER_DEGREE, haversine_km
+from utils.spatial_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH") or None
+# Speed assumed between the query point and the nearest graph node
+ROAD_GRAPH_ACCESS_SPEED_KMH = float(os.getenv("ROAD_GRAPH_ACCESS_SPEED_KMH", "20"))
+ROAD_GRAPH_SNAP_CELL_DEG = 0.005
+
+LatLng = tuple[float, float]
+
+
+class RoadGraph:
+    """Shortest-time routing over a CSR road graph with A* search."""
+
+    def __init__(
+        self,
+        node_lat: np.ndarray,
+        node_lng: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        travel_s: np.ndarray,
+        max_speed_kmh: float,
+    ) -> None:
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lng = np.asarray(node_lng, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.travel_s = np.asarray(travel_s, dtype=np.float32)
+        self.max_speed_kmh = float(max_speed_kmh)
+
+        # Plain lists: element access in the search loop is much faster than
+        # indexing NumPy scalars one at a time.
+        self._lat = self.node_lat.tolist()
+        self._lng = self.node_lng.tolist()
+        self._offsets = self.offsets.tolist()
+        self._targets = self.targets.tolist()
+        self._travel_s = self.travel_s.tolist()
+
+        self._snap = GridIndex(ROAD_GRAPH_SNAP_CELL_DEG)
+        for node, (lat, lng) in enumerate(zip(self._lat, self._lng)):
+            self._snap.insert(node, lat, lng)
+
+    @property
+    def node_count(self) -> int:
+        return len(self._lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._targets)
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_lat: list[float],
+        node_lng: list[float],
+        edges: list[tuple[int, int, float]],
+    ) -> "RoadGraph":
+        """Build from (source, target, travel_seconds) directed edges."""
+        n = len(node_lat)
+        edges = sorted(edges)
+        sources = np.fromiter((u for u, _, _ in edges), dtype=np.int64, count=len(edges))
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(offsets, sources + 1, 1)
+        offsets = np.cumsum(offsets)
+        targets = np.array([v for _, v, _ in edges], dtype=np.int32)
+        travel_s = np.array([t for _, _, t in edges], dtype=np.float32)
+
+        max_speed_kmh = 1.0
+        if edges:
+            lat = np.asarray(node_lat, dtype=np.float64)
+            lng = np.asarray(node_lng, dtype=np.float64)
+            lengths_km = haversine_km(lat[sources], lng[sources], lat[targets], lng[targets])
+            speeds = lengths_km / np.maximum(travel_s, 1e-3) * 3600
+            max_speed_kmh = max(float(speeds.max()), 1.0)
+
+        return cls(node_lat, node_lng, offsets, targets, travel_s, max_speed_kmh)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls(
+                data["node_lat"],
+                data["node_lng"],
+                data["offsets"],
+                data["targets"],
+                data["travel_s"],
+                float(data["max_speed_kmh"]),
+            )
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            node_lat=self.node_lat,
+            node_lng=self.node_lng,
+            offsets=self.offsets,
+            targets=self.targets,
+            travel_s=self.travel_s,
+            max_speed_kmh=np.float64(self.max_speed_kmh),
+        )
+
+    def nearest_node(self, lat: float, lng: float) -> tuple[int, float] | None:
+        """Closest graph node and its distance in km."""
+        nearest = self._snap.nearest(lat, lng, 1)
+        return nearest[0] if nearest else None
+
+    def _heuristic_s(self, node: int, goal_lat: float, goal_lng: float) -> float:
+        # Equirectangular lower bound on distance, divided by the top speed
+        lat = self._lat[node]
+        x = (self._lng[node] - goal_lng) * math.cos(math.radians((lat + goal_lat) / 2))
+        y = lat - goal_lat
+        # 0.995 absorbs the small error of the flat-earth approximation
+        km = 0.995 * KM_PER_DEGREE * math.hypot(x, y)
+        return km / self.max_speed_kmh * 3600
+
+    def shortest_path(self, source: int, target: int) -> tuple[float, list[int]] | None:
+        """A* shortest travel time; returns (seconds, node list) or None if unreachable."""
+        if source == target:
+            return 0.0, [source]
+
+        goal_lat, goal_lng = self._lat[target], self._lng[target]
+        offsets, targets, travel_s = self._offsets, self._targets, self._travel_s
+        best = {source: 0.0}
+        parent: dict[int, int] = {}
+        closed: set[int] = set()
+        heap = [(self._heuristic_s(source, goal_lat, goal_lng), 0.0, source)]
+
+        while heap:
+            _, cost, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == target:
+                nodes = [u]
+                while u in parent:
+                    u = parent[u]
+                    nodes.append(u)
+                nodes.reverse()
+                return cost, nodes
+            closed.add(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                new_cost = cost + travel_s[e]
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    parent[v] = u
+                    heapq.heappush(
+                        heap,
+                        (new_cost + self._heuristic_s(v, goal_lat, goal_lng), new_cost, v),
+                    )
+        return None
+
+    def _costs_from(self, source: int, goals: set[int]) -> dict[int, float]:
+        """One-to-many Dijkstra that stops once every goal is settled."""
+        offsets, targets, travel_s = self._offsets, self._targets, self._travel_s
+        remaining = set(goals)
+        best = {source: 0.0}
+        settled: dict[int, float] = {}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            cost, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = cost
+            remaining.discard(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                new_cost = cost + travel_s[e]
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    heapq.heappush(heap, (new_cost, v))
+        return {goal: settled[goal] for goal in goals if goal in settled}
+
+    def _access_s(self, distance_km: float) -> float:
+        return distance_km / ROAD_GRAPH_ACCESS_SPEED_KMH * 3600
+
+    def route(
+        self, origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float
+    ) -> tuple[int | None, list[LatLng] | None]:
+        """Same contract as maps_call.compute_route_eta_and_path."""
+        start = self.nearest_node(origin_lat, origin_lng)
+        end = self.nearest_node(dest_lat, dest_lng)
+        if start is None or end is None:
+            return None, None
+
+        result = self.shortest_path(start[0], end[0])
+        if result is None:
+            return None, None
+        seconds, nodes = result
+
+        eta_seconds = int(seconds + self._access_s(start[1]) + self._access_s(end[1]))
+        path = [(self._lat[n], self._lng[n]) for n in nodes]
+        if path[0] != (origin_lat, origin_lng):
+            path.insert(0, (origin_lat, origin_lng))
+        if path[-1] != (dest_lat, dest_lng):
+            path.append((dest_lat, dest_lng))
+        return eta_seconds, path
+
+    def route_matrix(
+        self, origins: list[LatLng], destinations: list[LatLng]
+    ) -> list[list[int | None]]:
+        """Same contract as maps_call.compute_route_matrix."""
+        etas: list[list[int | None]] = [[None] * len(destinations) for _ in origins]
+        dest_snaps = [self.nearest_node(lat, lng) for lat, lng in destinations]
+        goals = {snap[0] for snap in dest_snaps if snap is not None}
+
+        for i, (lat, lng) in enumerate(origins):
+            start = self.nearest_node(lat, lng)
+            if start is None:
+                continue
+            costs = self._costs_from(start[0], goals)
+            for j, snap in enumerate(dest_snaps):
+                if snap is None or snap[0] not in costs:
+                    continue
+                etas[i][j] = int(
+                    costs[snap[0]] + self._access_s(start[1]) + self._access_s(snap[1])
+                )
+        return etas
+
+
+_road_graph: Optional[RoadGraph] = None
+_load_attempted = False
+
+
+def load_road_graph(path: Optional[str] = ROAD_GRAPH_PATH) -> Optional[RoadGraph]:
+    """Load the graph from ROAD_GRAPH_PATH (once). Called from main.lifespan."""
+    global _road_graph, _load_attempted
+    if _load_attempted:
+        return _road_graph
+    _load_attempted = True
+    if not path:
+        return None
+    try:
+        _road_graph = RoadGraph.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning("Road graph not loaded from %s: %s", path, e)
+        return None
+    logger.info(
+        "Road graph loaded: %s nodes, %s edges",
+        _road_graph.node_count,
+        _road_graph.edge_count,
+    )
+    return _road_graph
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    """The loaded graph, or None when no local routing is configured."""
+    return load_road_graph()
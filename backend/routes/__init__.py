@@ -6,6 +6,7 @@ from routes.process_event import router as process_event_router
 from routes.ambulances import router as ambulances_router
 from routes.cameras import router as cameras_router
 from routes.hospitals import router as hospitals_router
+from routes.jobs import router as jobs_router
 from routes.live import router as live_router
 
 api_router = APIRouter()
@@ -15,4 +16,5 @@ api_router.include_router(process_event_router)
 api_router.include_router(ambulances_router)
 api_router.include_router(cameras_router)
 api_router.include_router(hospitals_router)
+api_router.include_router(jobs_router)
 api_router.include_router(live_router)
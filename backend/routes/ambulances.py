@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException
 from typing import List
 
 from models import Ambulance
-from utils.ambulance import simulate_ambulance
+from utils.json_codec import FastJSONResponse
+from utils.state_cache import state_cache
+from utils.ambulance import submit_simulation
 
 router = APIRouter(prefix="/ambulances", tags=["Ambulances"])
 
@@ -10,8 +12,15 @@ router = APIRouter(prefix="/ambulances", tags=["Ambulances"])
 @router.get("", response_model=List[Ambulance])
 async def get_ambulances():
     """Get all ambulances."""
-    ambulances = await Ambulance.find_all().to_list()
-    return ambulances
+    ambulances = await state_cache.find_all(Ambulance)
+    # Positions of moving units are interpolated from their timed routes;
+    # the cached documents are shared, so only the response is changed
+    return FastJSONResponse(
+        [
+            {**ambulance.model_dump(by_alias=True), **ambulance.motion_fields()}
+            for ambulance in ambulances
+        ]
+    )
 
 
 @router.post("/{ambulance_id}/simulate")
@@ -20,5 +29,6 @@ async def simulate_ambulance_route(ambulance_id: str):
     if not ambulance:
         raise HTTPException(status_code=404, detail="Ambulance not found")
 
-    await simulate_ambulance(ambulance.id)
-    return {"ok": True, "ambulance_id": str(ambulance.id)}
+    # Runs for the whole drive; poll GET /jobs/{job_id} for the outcome
+    job = submit_simulation(ambulance.id)
+    return {"ok": True, "ambulance_id": str(ambulance.id), "job_id": job.id}
@@ -3,13 +3,14 @@ from fastapi import APIRouter, HTTPException  # type: ignore
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timezone
-import math
 import random
 
-from choose_ambulance import get_ambulance_and_path
-from utils.ambulance import simulate_ambulance
-from models import Camera, Event, EventStatus, Severity, Ambulance, AmbulanceStatus
-from utils.live_ws import broadcast_all
+from utils.ambulance import dispatch_and_simulate
+from utils.jobs import job_runner
+from models import Camera, Event, EventStatus, Severity
+from utils.json_codec import FastJSONResponse
+from utils.state_cache import state_cache
+from utils.live_ws import broadcast_documents
 
 router = APIRouter(prefix="/cameras", tags=["Cameras"])
 
@@ -25,7 +26,7 @@ class RegisterCameraRequest(BaseModel):
 @router.get("", response_model=List[Camera])
 async def get_cameras():
     """Get all cameras."""
-    cameras = await Camera.find_all().to_list()
+    cameras = await state_cache.find_all(Camera)
     # Ensure all cameras have correct URLs based on their names
     # This fixes any cameras that might have been created with wrong URLs
     # Handle both hyphen and underscore variants (e.g., "Astra-18" vs "Astra_18")
@@ -57,9 +58,9 @@ async def get_cameras():
 
     if updated:
         # Re-fetch to return updated cameras
-        cameras = await Camera.find_all().to_list()
+        cameras = await state_cache.find_all(Camera)
 
-    return cameras
+    return FastJSONResponse(cameras)
 
 
 @router.post("/register")
@@ -77,51 +78,11 @@ async def register_camera(request: RegisterCameraRequest):
         name=request.name or request.id,
     )
     await camera.insert()
-    await broadcast_all("cameras")
+    broadcast_documents("cameras", [camera])
 
     return {"ok": True, "camera": camera}
 
 
-def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance between two points in kilometers (Haversine formula)."""
-    R = 6371  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlng / 2) ** 2
-    )
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
-
-async def find_nearest_idle_ambulance(
-    event_lat: float, event_lng: float
-) -> Optional[Ambulance]:
-    """Find the nearest idle ambulance to the event location."""
-    ambulances = await Ambulance.find(
-        Ambulance.status == AmbulanceStatus.IDLE
-    ).to_list()
-
-    if not ambulances:
-        return None
-
-    nearest = None
-    min_distance = float("inf")
-
-    for ambulance in ambulances:
-        distance = calculate_distance(
-            event_lat, event_lng, ambulance.lat, ambulance.lng
-        )
-        if distance < min_distance:
-            min_distance = distance
-            nearest = ambulance
-
-    return nearest
-
-
 @router.post("/{camera_id}/trigger_emergency")
 async def trigger_emergency(camera_id: str):
     """Manually trigger an emergency event for a camera."""
@@ -179,17 +140,10 @@ async def trigger_emergency(camera_id: str):
         created_at=datetime.now(timezone.utc),
     )
     await event.insert()
-    await broadcast_all("events")
-
-    # Assign nearest idle ambulance
-    ambulance, eta, path = await get_ambulance_and_path(event.id)
-    if ambulance:
-        ambulance.path = path
-        ambulance.eta_seconds = eta
-        await ambulance.save()
-        await simulate_ambulance(ambulance.id)
-    else:
-        print("[Backend] No idle ambulances available to assign.")
+    broadcast_documents("events", [event])
+
+    # Dispatch and the drive there and back run in the background
+    job = job_runner.submit("dispatch", dispatch_and_simulate, event.id, key=str(event.id))
 
     print(
         f"[Backend] Manual emergency triggered for camera {camera_id}: {scenario['title']}"
@@ -198,5 +152,6 @@ async def trigger_emergency(camera_id: str):
     return {
         "ok": True,
         "event": event,
+        "job_id": job.id,
         "message": f"Emergency triggered: {scenario['title']}",
     }
@@ -1,17 +1,38 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
-from models import Event, EventStatus, Ambulance, AmbulanceStatus, Camera
-from utils.live_ws import broadcast_all
+from dispatch_batcher import dispatch_batcher
+from models import Event, EventStatus, Ambulance
+from utils.ambulance import cancel_simulation, free_ambulance
+from utils.camera_names import camera_names
+from utils.event_query import (
+    EVENTS_PAGE_SIZE,
+    EVENTS_PAGE_SIZE_MAX,
+    SORT,
+    EventQuery,
+    decode_cursor,
+    encode_cursor,
+    parse_bbox,
+    parse_fields,
+    select,
+    sort_key,
+    to_response,
+)
+from utils.json_codec import FastJSONResponse
+from utils.live_ws import broadcast_documents
+from utils.state_cache import state_cache
 from beanie import PydanticObjectId
 
 router = APIRouter(prefix="/events", tags=["Events"])
 
 
 class EventResponse(BaseModel):
-    """Response model for events that converts _id to id and ObjectIds to strings."""
+    """Response model for events that converts _id to id and ObjectIds to strings.
+
+    With ?fields=, only the requested fields are returned.
+    """
 
     id: str
     severity: str
@@ -27,46 +48,67 @@ class EventResponse(BaseModel):
     created_at: datetime
     resolved_at: Optional[datetime] = None
 
-    @classmethod
-    async def from_event(cls, event: Event) -> "EventResponse":
-        """Convert Event document to EventResponse."""
-        # Fetch camera name if camera_id exists
-        camera_name = None
-        if event.camera_id:
-            camera = await Camera.get(event.camera_id)
-            camera_name = camera.name if camera else None
-        
-        return cls(
-            id=str(event.id),
-            severity=event.severity.value,
-            title=event.title,
-            description=event.description,
-            reference_clip_url=event.reference_clip_url,
-            lat=event.lat,
-            lng=event.lng,
-            camera_id=str(event.camera_id),
-            camera_name=camera_name,
-            ambulance_id=str(event.ambulance_id) if event.ambulance_id else None,
-            status=event.status.value,
-            created_at=event.created_at,
-            resolved_at=event.resolved_at,
-        )
-
 
 @router.get("", response_model=List[EventResponse])
-async def get_events(status: Optional[EventStatus] = None):
-    """Get all events, optionally filtered by status."""
-    if status:
-        events = await Event.find(Event.status == status).to_list()
+async def get_events(
+    status: Optional[EventStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bbox: Optional[str] = Query(None, description="south,west,north,east"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(EVENTS_PAGE_SIZE, ge=1, le=EVENTS_PAGE_SIZE_MAX),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
+    """Get events newest first, one page at a time.
+
+    The next page's cursor is returned in the X-Next-Cursor header.
+    """
+    try:
+        query = EventQuery(
+            status=status.value if status else None,
+            since=since,
+            until=until,
+            bbox=parse_bbox(bbox),
+            after=decode_cursor(cursor) if cursor else None,
+            limit=limit,
+            fields=parse_fields(fields),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cached = state_cache.cached(Event)
+    if status and status != EventStatus.RESOLVED and cached is not None:
+        # Live events are served from memory; resolved ones are history
+        matching = [
+            data
+            for data in (event.model_dump(by_alias=True) for event in cached)
+            if query.matches(data)
+        ]
+        page = sorted(matching, key=sort_key, reverse=True)[: limit + 1]
     else:
-        events = await Event.find_all().to_list()
+        page = await (
+            Event.get_pymongo_collection()
+            .find(query.mongo_filter(), query.projection())
+            .sort(SORT)
+            .limit(limit + 1)
+            .to_list(limit + 1)
+        )
+
+    headers = {}
+    if len(page) > limit:
+        page = page[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(*sort_key(page[-1]))
 
-    # Convert Event documents to EventResponse with camera names
-    return [await EventResponse.from_event(event) for event in events]
+    names = {}
+    if query.fields is None or "camera_name" in query.fields:
+        # Camera names for the whole page in one lookup
+        names = await camera_names.resolve(event.get("camera_id") for event in page)
+    responses = [to_response(event, names.get(event.get("camera_id"))) for event in page]
+    return FastJSONResponse(select(responses, query.fields), headers=headers)
 
 
 @router.post("/{event_id}/resolve")
-async def resolve_event(event_id: int):
+async def resolve_event(event_id: PydanticObjectId):
     """Mark an event as resolved and free the assigned ambulance."""
     event = await Event.get(event_id)
     if not event:
@@ -74,19 +116,16 @@ async def resolve_event(event_id: int):
 
     event.status = EventStatus.RESOLVED
     event.resolved_at = datetime.utcnow()
+    dispatch_batcher.backlog.discard(event.id)
+    # Saved first, so a cancelled simulation does not reopen the event
+    await event.save()
+    broadcast_documents("events", [event])
 
-    # Free the ambulance
+    # Stop the drive and free the ambulance where it is now
     if event.ambulance_id:
+        cancel_simulation(event.ambulance_id)
         ambulance = await Ambulance.get(event.ambulance_id)
         if ambulance:
-            ambulance.status = AmbulanceStatus.IDLE
-            ambulance.event_id = None
-            ambulance.eta_seconds = None
-            ambulance.updated_at = datetime.utcnow()
-            await ambulance.save()
-            await broadcast_all("ambulances")
-
-    await event.save()
-    await broadcast_all("events")
+            await free_ambulance(ambulance, event.id)
 
     return {"ok": True, "event": event}
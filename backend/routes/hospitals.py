@@ -1,7 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from typing import List
 
 from models import Hospital
+from utils.spatial_index import geo_near
+from utils.state_cache import state_cache
 
 router = APIRouter(prefix="/hospitals", tags=["Hospitals"])
 
@@ -9,5 +11,17 @@ router = APIRouter(prefix="/hospitals", tags=["Hospitals"])
 @router.get("", response_model=List[Hospital])
 async def get_hospitals():
     """Get all hospitals."""
-    hospitals = await Hospital.find_all().to_list()
+    hospitals = await state_cache.find_all(Hospital)
     return hospitals
+
+
+@router.get("/nearest")
+async def get_nearest_hospitals(
+    lat: float, lng: float, k: int = Query(1, ge=1, le=50)
+):
+    """The k hospitals closest to a point, nearest first."""
+    nearest = await geo_near(Hospital, lat, lng, k)
+    return [
+        {"hospital": hospital, "distance_km": round(distance_km, 3)}
+        for hospital, distance_km in nearest
+    ]
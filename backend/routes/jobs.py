@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from utils.jobs import JobStatus, job_runner
+from utils.json_codec import FastJSONResponse
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("")
+async def get_jobs(kind: Optional[str] = None, status: Optional[JobStatus] = None):
+    """List background jobs, newest first."""
+    return FastJSONResponse(
+        {
+            "jobs": [job.to_dict() for job in job_runner.find(kind, status)],
+            "stats": job_runner.stats(),
+        }
+    )
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return FastJSONResponse(job.to_dict())
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_runner.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status.value}")
+    return {"ok": True, "job_id": job_id}
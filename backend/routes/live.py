@@ -1,22 +1,93 @@
+import json
+import logging
+from typing import Optional
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from utils.live_ws import manager
+from utils.live_bus import live_bus
+from utils.live_subscriptions import Subscription
+from utils.live_ws import ENTITY_MODELS, manager, resume_or_snapshot, send_snapshots
+from utils.position_stream import position_stream
+from utils.state_cache import state_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Live"])
 
 
 @router.get("/ws/live/clients")
 async def get_live_client_count():
-    return {"connections": manager.connection_count()}
+    return {
+        "connections": manager.connection_count(),
+        "clients": manager.client_stats(),
+        "positions": position_stream.stats(),
+        "bus": live_bus.stats(),
+        "state_cache": state_cache.stats(),
+    }
+
+
+def _last_seq(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 
 @router.websocket("/ws/live")
 async def live_updates(websocket: WebSocket):
+    """Live frames. Reconnect with ?epoch=...&last_seq=... to resume."""
     await manager.connect(websocket)
     try:
+        await resume_or_snapshot(
+            websocket,
+            websocket.query_params.get("epoch"),
+            _last_seq(websocket.query_params.get("last_seq")),
+        )
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            kind = message.get("type")
+            # Sent by clients that noticed a gap in the sequence numbers
+            if kind == "resync":
+                await resume_or_snapshot(websocket)
+            elif kind in ("subscribe", "unsubscribe"):
+                try:
+                    subscription = (
+                        Subscription.parse(message, ENTITY_MODELS)
+                        if kind == "subscribe"
+                        else None
+                    )
+                except (TypeError, ValueError) as e:
+                    logger.warning("Ignoring bad live subscription %s: %s", message, e)
+                    continue
+                if manager.subscribe(websocket, subscription):
+                    # A new view starts empty, so replayed frames could not
+                    # remove what the client showed under its old one
+                    await send_snapshots(websocket)
+                else:
+                    await resume_or_snapshot(
+                        websocket, message.get("epoch"), _last_seq(message.get("last_seq"))
+                    )
     except WebSocketDisconnect:
         await manager.disconnect(websocket)
     except Exception:
         await manager.disconnect(websocket)
+
+
+@router.websocket("/ws/live/positions")
+async def live_positions(websocket: WebSocket):
+    """Binary ambulance positions; see utils/position_stream.py for the format."""
+    await position_stream.connect(websocket)
+    try:
+        # Nothing is expected from the client; just wait for it to leave
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await position_stream.disconnect(websocket)
@@ -1,12 +1,11 @@
 from fastapi import APIRouter, HTTPException  # type: ignore
 from pydantic import BaseModel
-from typing import Optional
 from datetime import datetime, timezone
-import math
 import random
 
-from models import Event, EventStatus, Severity, Camera, Ambulance, AmbulanceStatus
-from utils.live_ws import broadcast_all
+from dispatch_batcher import dispatch_batcher
+from models import Event, EventStatus, Severity, Camera, camera_name_key
+from utils.live_ws import broadcast_documents
 
 router = APIRouter(tags=["Process Event"])
 
@@ -19,46 +18,6 @@ class ProcessEventRequest(BaseModel):
     reference_clip_url: str
 
 
-def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance between two points in kilometers (Haversine formula)."""
-    R = 6371  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlng / 2) ** 2
-    )
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
-
-async def find_nearest_idle_ambulance(
-    event_lat: float, event_lng: float
-) -> Optional[Ambulance]:
-    """Find the nearest idle ambulance to the event location."""
-    ambulances = await Ambulance.find(
-        Ambulance.status == AmbulanceStatus.IDLE
-    ).to_list()
-
-    if not ambulances:
-        return None
-
-    nearest = None
-    min_distance = float("inf")
-
-    for ambulance in ambulances:
-        distance = calculate_distance(
-            event_lat, event_lng, ambulance.lat, ambulance.lng
-        )
-        if distance < min_distance:
-            min_distance = distance
-            nearest = ambulance
-
-    return nearest
-
-
 @router.post("/process_event")
 async def process_event(request: ProcessEventRequest):
     """Main ingestion endpoint for events from AI/camera service."""
@@ -75,23 +34,13 @@ async def process_event(request: ProcessEventRequest):
     port = camera_port_map.get(request.camera_id, 5055)  # Default to 5055 if unknown
     
     # Get or create camera by name (camera_id is the camera name like "CAM_12")
-    # Try exact match first, then try case-insensitive and variant matching
+    # Exact match first, then case-insensitive / hyphen-vs-underscore variants
+    # through the indexed normalized name
     camera = await Camera.find_one(Camera.name == request.camera_id)
     if not camera:
-        # Try case-insensitive match and variants (hyphen vs underscore)
-        all_cameras = await Camera.find_all().to_list()
-        for cam in all_cameras:
-            if cam.name:
-                # Exact match (case-insensitive)
-                if cam.name.lower() == request.camera_id.lower():
-                    camera = cam
-                    break
-                # Variant match (hyphen vs underscore)
-                normalized_name = cam.name.replace("-", "_")
-                normalized_request = request.camera_id.replace("-", "_")
-                if normalized_name.lower() == normalized_request.lower():
-                    camera = cam
-                    break
+        camera = await Camera.find_one(
+            Camera.name_key == camera_name_key(request.camera_id)
+        )
     
     if not camera:
         print(
@@ -105,7 +54,7 @@ async def process_event(request: ProcessEventRequest):
             name=request.camera_id,
         )
         await camera.insert()
-        await broadcast_all("cameras")
+        broadcast_documents("cameras", [camera])
         print(f"[Backend] Created new camera: {camera.id} ({camera.name}) on port {port}")
     else:
         # Update existing camera's frame URL if it doesn't match the correct port
@@ -114,7 +63,7 @@ async def process_event(request: ProcessEventRequest):
             print(f"[Backend] Updating camera {camera.name} frame URL from {camera.latest_frame_url} to {expected_url}")
             camera.latest_frame_url = expected_url
             await camera.save()
-            await broadcast_all("cameras")
+            broadcast_documents("cameras", [camera])
         print(f"[Backend] Found existing camera: {camera.id} ({camera.name}) on port {port}")
 
     # Add small jitter to event location (mock variation from camera)
@@ -134,29 +83,14 @@ async def process_event(request: ProcessEventRequest):
         created_at=datetime.now(timezone.utc),
     )
     await event.insert()
-    await broadcast_all("events")
+    broadcast_documents("events", [event])
     print(f"[Backend] Created event: {event.id} - {event.title} ({event.severity})")
 
-    # If emergency, assign nearest idle ambulance
+    # If emergency, assign an ambulance; events arriving together are
+    # dispatched jointly and the batcher broadcasts the result
     if request.severity == Severity.EMERGENCY:
-        ambulance = await find_nearest_idle_ambulance(jitter_lat, jitter_lng)
+        ambulance, _, _ = await dispatch_batcher.submit(event.id)
         if ambulance:
-            # Calculate initial ETA
-            distance = calculate_distance(
-                jitter_lat, jitter_lng, ambulance.lat, ambulance.lng
-            )
-            eta_seconds = int((distance / 60) * 3600)  # Assume 60 km/h average speed
-
-            ambulance.status = AmbulanceStatus.ENROUTE
-            ambulance.event_id = event.id
-            ambulance.eta_seconds = eta_seconds
-            ambulance.updated_at = datetime.now(timezone.utc)
-            await ambulance.save()
-            await broadcast_all("ambulances")
-
-            event.ambulance_id = ambulance.id
-            event.status = EventStatus.ENROUTE
-            await event.save()
-            await broadcast_all("events")
+            event = await Event.get(event.id)
 
     return {"ok": True, "event": event}
@@ -1,6 +1,19 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
 class Point(BaseModel):
     lat: float
     lng: float
+
+
+class GeoPoint(BaseModel):
+    """GeoJSON point, as MongoDB 2dsphere indexes expect ([lng, lat] order)."""
+
+    type: Literal["Point"] = "Point"
+    coordinates: tuple[float, float]
+
+    @classmethod
+    def of(cls, lat: float, lng: float) -> "GeoPoint":
+        return cls(coordinates=(lng, lat))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Local stand-in for Redis pub/sub, for running several workers offline.
+
+Speaks just enough RESP for the live bus (PING, PUBLISH, SUBSCRIBE,
+UNSUBSCRIBE, QUIT):
+
+    python stub_pubsub_server.py --port 6390
+    LIVE_BUS_URL=redis://127.0.0.1:6390 uvicorn main:app --workers 4
+"""
+
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from utils.live_bus import LiveBusError, read_reply
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _push(*items: bytes | int) -> bytes:
+    parts = [b"*%d\r\n" % len(items)]
+    for item in items:
+        parts.append(b":%d\r\n" % item if isinstance(item, int) else _bulk(item))
+    return b"".join(parts)
+
+
+class StubPubSubServer:
+    """Minimal asyncio server fanning PUBLISH out to SUBSCRIBE connections."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.published = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._channels: dict[bytes, set[asyncio.StreamWriter]] = {}
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in self._connections:
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def _unsubscribe(self, writer: asyncio.StreamWriter, channel: bytes) -> None:
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self._channels[channel]
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._connections[writer] = asyncio.current_task()
+        subscriptions: set[bytes] = set()
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR expected a command array\r\n")
+                    continue
+                name = command[0].upper()
+                if name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name == b"PUBLISH" and len(command) == 3:
+                    _, channel, message = command
+                    subscribers = self._channels.get(channel, set())
+                    for subscriber in subscribers:
+                        subscriber.write(_push(b"message", channel, message))
+                    self.published += 1
+                    writer.write(b":%d\r\n" % len(subscribers))
+                elif name == b"SUBSCRIBE":
+                    for channel in command[1:]:
+                        subscriptions.add(channel)
+                        self._channels.setdefault(channel, set()).add(writer)
+                        writer.write(_push(b"subscribe", channel, len(subscriptions)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in command[1:] or list(subscriptions):
+                        subscriptions.discard(channel)
+                        self._unsubscribe(writer, channel)
+                        writer.write(_push(b"unsubscribe", channel, len(subscriptions)))
+                elif name == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, LiveBusError, ValueError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._unsubscribe(writer, channel)
+            self._connections.pop(writer, None)
+            writer.close()
+
+
+@asynccontextmanager
+async def serve_stub_pubsub(
+    host: str = "127.0.0.1", port: int = 0
+) -> AsyncIterator[StubPubSubServer]:
+    """Run a stub server for the duration of the block (port 0 picks a free one)."""
+    server = StubPubSubServer(host, port)
+    await server.start()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+async def _main(host: str, port: int) -> None:
+    async with serve_stub_pubsub(host, port) as server:
+        print(f"Stub pub/sub listening on {server.url}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(_main(args.host, args.port))
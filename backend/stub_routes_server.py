@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Google Routes API.
+
+Speaks just enough HTTP/1.1 (with keep-alive) to answer computeRoutes and
+computeRouteMatrix with straight-line routes, so dispatch can run and be
+benchmarked offline:
+
+    python stub_routes_server.py --port 8787
+    ROUTES_API_BASE_URL=http://127.0.0.1:8787 python main.py
+"""
+
+import argparse
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import polyline
+
+from utils.geo import calculate_distance
+
+STUB_SPEED_KMH = 40.0
+
+
+def _lat_lng(waypoint: dict) -> tuple[float, float]:
+    lat_lng = waypoint["location"]["latLng"]
+    return lat_lng["latitude"], lat_lng["longitude"]
+
+
+def _duration_seconds(origin: tuple[float, float], dest: tuple[float, float]) -> int:
+    return int(calculate_distance(*origin, *dest) / STUB_SPEED_KMH * 3600)
+
+
+def compute_routes(body: dict) -> dict:
+    origin = _lat_lng(body["origin"])
+    dest = _lat_lng(body["destination"])
+    return {
+        "routes": [
+            {
+                "duration": f"{_duration_seconds(origin, dest)}s",
+                "polyline": {"encodedPolyline": polyline.encode([origin, dest])},
+            }
+        ]
+    }
+
+
+def compute_route_matrix(body: dict) -> list[dict]:
+    origins = [_lat_lng(o["waypoint"]) for o in body["origins"]]
+    destinations = [_lat_lng(d["waypoint"]) for d in body["destinations"]]
+    elements = []
+    for i, origin in enumerate(origins):
+        for j, dest in enumerate(destinations):
+            element = {
+                "duration": f"{_duration_seconds(origin, dest)}s",
+                "condition": "ROUTE_EXISTS",
+            }
+            # Like the real API (proto3 JSON), zero indices are omitted
+            if i:
+                element["originIndex"] = i
+            if j:
+                element["destinationIndex"] = j
+            elements.append(element)
+    return elements
+
+
+HANDLERS = {
+    "/directions/v2:computeRoutes": compute_routes,
+    "/distanceMatrix/v2:computeRouteMatrix": compute_route_matrix,
+}
+
+
+class StubRoutesServer:
+    """Minimal asyncio HTTP server routing POST bodies to HANDLERS."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Drop idle keep-alive connections and let their handlers finish
+            for writer in self._connections:
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                self.requests += 1
+                handler = HANDLERS.get(target.split("?", 1)[0])
+                if handler is None:
+                    status, payload = "404 Not Found", {"error": "not found"}
+                else:
+                    try:
+                        status, payload = "200 OK", handler(json.loads(body or b"{}"))
+                    except (KeyError, TypeError, ValueError) as e:
+                        status, payload = "400 Bad Request", {"error": str(e)}
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+
+@asynccontextmanager
+async def serve_stub_routes(
+    host: str = "127.0.0.1", port: int = 0
+) -> AsyncIterator[StubRoutesServer]:
+    """Run a stub server for the duration of the block (port 0 picks a free one)."""
+    server = StubRoutesServer(host, port)
+    await server.start()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+async def _main(host: str, port: int) -> None:
+    async with serve_stub_routes(host, port) as server:
+        print(f"Stub Routes API listening on {server.base_url}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+    asyncio.run(_main(args.host, args.port))
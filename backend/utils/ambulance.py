@@ -2,12 +2,18 @@ import asyncio
 import logging
 import random
 from datetime import datetime
+from typing import Any, Optional
 
 from beanie import PydanticObjectId
 
+from dispatch_batcher import dispatch_batcher
 from models import Ambulance, AmbulanceStatus, Event, EventStatus
-from utils.live_ws import broadcast_all
-from schemas import Point
+from schemas import GeoPoint
+from utils.live_ws import broadcast_documents
+from utils.jobs import Job, job_runner
+from utils.motion import plan_route
+from utils.simulation import simulation_engine
+from utils.state_cache import state_cache
 
 logger = logging.getLogger(__name__)
 
@@ -16,72 +22,190 @@ def _resolve_status(status_name: str, fallback: AmbulanceStatus) -> AmbulanceSta
     return getattr(AmbulanceStatus, status_name, fallback)
 
 
-def _set_location(ambulance: Ambulance, point: Point) -> None:
-    if hasattr(ambulance, "location"):
-        ambulance.location = point
-    else:
-        ambulance.lat = point.lat
-        ambulance.lng = point.lng
+async def simulate_ambulance(ambulance_id: PydanticObjectId):
+    """Simulate an ambulance driving its timed route and returning.
 
-
-async def _walk_path(
-    ambulance: Ambulance,
-    path: list[Point],
-    status: AmbulanceStatus,
-    update_interval_ms: int,
-) -> None:
-    while path:
-        next_point = path.pop(0)
-        _set_location(ambulance, next_point)
-        ambulance.status = status
-        ambulance.path = path
-        await ambulance.save()
-        await broadcast_all("ambulances")
-        logger.info(
-            "Ambulance %s moved to %s,%s",
-            ambulance.id,
-            next_point.lat,
-            next_point.lng,
-        )
-        await asyncio.sleep(update_interval_ms / 1000)
-
-
-async def simulate_ambulance(
-    ambulance_id: PydanticObjectId,
-    update_interval_ms: int = 1000,
-):
-    """Simulate an ambulance moving along its path and returning."""
+    If the simulation is cancelled (POST /jobs/{id}/cancel, shutdown, a new
+    claim), the unit is freed where it is, and an event it had not reached
+    yet is reopened for dispatch.
+    """
     ambulance = await Ambulance.get(ambulance_id)
     if not ambulance:
         raise ValueError(f"Ambulance {ambulance_id} not found")
 
-    if not ambulance.path:
+    if not ambulance.path_encoded:
         return
 
-    original_path = list(ambulance.path)
-
     enroute_status = _resolve_status("ENROUTE", AmbulanceStatus.IDLE)
     returning_status = _resolve_status("RETURNING", AmbulanceStatus.IDLE)
-    free_status = _resolve_status("FREE", AmbulanceStatus.IDLE)
-
-    await _walk_path(ambulance, list(original_path), enroute_status, update_interval_ms)
-
-    if ambulance.event_id:
-        await asyncio.sleep(5)
-        event = await Event.get(ambulance.event_id)
-        if event and event.status != EventStatus.RESOLVED:
-            event.status = EventStatus.RESOLVED
-            event.resolved_at = datetime.utcnow()
-            await event.save()
-            await broadcast_all("events")
-
-    reverse_path = list(reversed(original_path))
-    await _walk_path(ambulance, reverse_path, returning_status, update_interval_ms)
-
-    ambulance.path = []
-    ambulance.status = free_status
-    await ambulance.save()
-    await broadcast_all("ambulances")
+    # The assignment this run drives; the unit is only freed while it holds
+    event_id = ambulance.event_id
+
+    arrived = False
+    try:
+        outbound = ambulance.motion()
+        if outbound is None:
+            # Route stored without timing: drive the rest of it from here
+            await ambulance.set(
+                {
+                    **plan_route(
+                        ambulance.remaining_path(),
+                        ambulance.eta_seconds,
+                        datetime.utcnow(),
+                        tolerance_m=0,
+                    ),
+                    "status": enroute_status,
+                }
+            )
+            outbound = ambulance.motion()
+            broadcast_documents("ambulances", [ambulance])
+        elif ambulance.status != enroute_status:
+            await ambulance.set({Ambulance.status: enroute_status})
+            broadcast_documents("ambulances", [ambulance])
+        original_path = ambulance.decoded_path()
+
+        await simulation_engine.follow(ambulance)
+        arrived = True
+
+        if event_id:
+            await asyncio.sleep(5)
+            await _resolve_event(event_id)
+
+        # Same route back, as long as it took on the way out
+        await ambulance.set(
+            {
+                **plan_route(
+                    list(reversed(original_path)),
+                    outbound.duration_s if outbound else None,
+                    datetime.utcnow(),
+                    # Already simplified on the way out
+                    tolerance_m=0,
+                ),
+                "status": returning_status,
+            }
+        )
+        broadcast_documents("ambulances", [ambulance])
+        await simulation_engine.follow(ambulance)
+    except asyncio.CancelledError:
+        # Shielded: a second cancel must not strand the unit halfway through
+        await asyncio.shield(_release_cancelled(ambulance, event_id, arrived))
+        raise
+
+    await free_ambulance(ambulance, event_id)
+
+
+async def _resolve_event(event_id: PydanticObjectId) -> None:
+    event = await Event.get(event_id)
+    if event and event.status != EventStatus.RESOLVED:
+        event.status = EventStatus.RESOLVED
+        event.resolved_at = datetime.utcnow()
+        await event.save()
+        broadcast_documents("events", [event])
+
+
+async def free_ambulance(
+    ambulance: Ambulance, event_id: Optional[PydanticObjectId]
+) -> bool:
+    """Make the unit IDLE where its route puts it now, with no route.
+
+    Only applies while the unit is still assigned to event_id, so a run
+    that was overtaken by a newer claim cannot undo it. Returns whether the
+    unit was freed.
+    """
+    now = datetime.utcnow()
+    fields = {
+        "lat": ambulance.lat,
+        "lng": ambulance.lng,
+        **ambulance.motion_fields(now),
+        **plan_route(None, None, now),
+        "status": AmbulanceStatus.IDLE,
+        "event_id": None,
+        "eta_seconds": None,
+        "updated_at": now,
+    }
+    fields["location"] = GeoPoint.of(fields["lat"], fields["lng"])
+    updated = await Ambulance.find_one(
+        {"_id": ambulance.id, "event_id": event_id}
+    ).update({"$set": {**fields, "location": fields["location"].model_dump()}})
+    if updated.matched_count == 0:
+        logger.info("Ambulance %s no longer holds event %s; left as is", ambulance.id, event_id)
+        return False
+    for name, value in fields.items():
+        setattr(ambulance, name, value)
+    # Query updates bypass the document hooks
+    state_cache.apply(ambulance)
+    broadcast_documents("ambulances", [ambulance])
+    dispatch_batcher.notify_unit_available()
+    return True
+
+
+async def _release_cancelled(
+    ambulance: Ambulance, event_id: Optional[PydanticObjectId], arrived: bool
+) -> None:
+    """Free a unit whose simulation was cancelled, at its current position."""
+    try:
+        if event_id and arrived:
+            await _resolve_event(event_id)
+        elif event_id:
+            event = await Event.get(event_id)
+            if (
+                event
+                and event.status == EventStatus.ENROUTE
+                and event.ambulance_id == ambulance.id
+            ):
+                # Back to the backlog; load_backlog picks it up after a restart
+                event.status = EventStatus.OPEN
+                event.ambulance_id = None
+                event.dispatched_at = None
+                await event.save()
+                broadcast_documents("events", [event])
+                dispatch_batcher.backlog.push(event, simulate=True)
+        if await free_ambulance(ambulance, event_id):
+            logger.info("Simulation of ambulance %s cancelled; unit freed", ambulance.id)
+    except Exception:
+        logger.exception("Could not free ambulance %s after cancel", ambulance.id)
+
+
+def cancel_simulation(ambulance_id: PydanticObjectId) -> bool:
+    """Cancel the running simulation of one ambulance, if there is one."""
+    job = job_runner.active("simulate", str(ambulance_id))
+    return job is not None and job_runner.cancel(job.id)
+
+
+async def dispatch_and_simulate(event_id: PydanticObjectId) -> dict[str, Any]:
+    """Assign a unit to the event and start its drive there and back.
+
+    The drive runs as its own "simulate" job keyed by the ambulance, so a
+    unit is never simulated twice at once. Without a free unit the event
+    waits in the dispatch backlog, which starts the simulation itself once a
+    unit is assigned.
+    """
+    ambulance, eta, _ = await dispatch_batcher.submit(event_id, simulate=True)
+    if not ambulance:
+        print("[Backend] No idle ambulances available; event queued for dispatch.")
+        return {"ambulance_id": None, "queued": True}
+    job = submit_simulation(ambulance.id, replace=True)
+    return {
+        "ambulance_id": ambulance.id,
+        "eta_seconds": eta,
+        "queued": False,
+        "simulate_job_id": job.id,
+    }
+
+
+def submit_simulation(ambulance_id: PydanticObjectId, replace: bool = False) -> Job:
+    """Start (or join) the background simulation of one ambulance.
+
+    After a new claim, pass replace=True: a run still finishing the unit's
+    previous assignment is cancelled instead of joined.
+    """
+    return job_runner.submit(
+        "simulate",
+        simulate_ambulance,
+        ambulance_id,
+        key=str(ambulance_id),
+        replace=replace,
+    )
 
 
 if __name__ == "__main__":
@@ -92,6 +216,6 @@ if __name__ == "__main__":
         await init_db()
         # Replace with a valid ambulance ID from your database
         ambulance_id = PydanticObjectId("696c2d67f92424a53226ff1b")
-        await simulate_ambulance(ambulance_id, update_interval_ms=2000)
+        await simulate_ambulance(ambulance_id)
 
     asyncio.run(main())
@@ -0,0 +1,67 @@
+"""Camera id -> name lookups for event listings.
+
+Names are cached in memory and dropped whenever the camera is written
+(Camera event hooks locally, live-bus marks from other workers). Misses
+are resolved together: from the state cache when it is loaded, otherwise
+with a single $in query projected to the name.
+"""
+
+from typing import Iterable, Optional
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+from pydantic import BaseModel, Field
+
+
+class _CameraName(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    name: Optional[str] = None
+
+
+class CameraNameCache:
+    def __init__(self) -> None:
+        # None is cached too: the camera is unnamed or does not exist
+        self._names: dict[PydanticObjectId, Optional[str]] = {}
+        # Bumped on every invalidation, so a load racing a write is not kept
+        self._generation = 0
+
+    def invalidate(self, camera_id: Optional[PydanticObjectId] = None) -> None:
+        """Forget one camera's name, or every name when camera_id is None."""
+        self._generation += 1
+        if camera_id is None:
+            self._names.clear()
+        else:
+            self._names.pop(camera_id, None)
+
+    async def resolve(
+        self, camera_ids: Iterable[Optional[PydanticObjectId]]
+    ) -> dict[PydanticObjectId, Optional[str]]:
+        """Names for the given cameras, loading all misses in one go."""
+        from models import Camera
+        from utils.state_cache import state_cache
+
+        wanted = {camera_id for camera_id in camera_ids if camera_id is not None}
+        missing = [camera_id for camera_id in wanted if camera_id not in self._names]
+        loaded: dict[PydanticObjectId, Optional[str]] = dict.fromkeys(missing)
+        if missing:
+            generation = self._generation
+            cameras = state_cache.cached(Camera)
+            if cameras is not None:
+                for camera in cameras:
+                    if camera.id in loaded:
+                        loaded[camera.id] = camera.name
+            else:
+                found = await Camera.find(
+                    In(Camera.id, missing), projection_model=_CameraName
+                ).to_list()
+                for camera in found:
+                    loaded[camera.id] = camera.name
+            if generation == self._generation:
+                self._names.update(loaded)
+        return {
+            camera_id: loaded[camera_id] if camera_id in loaded else self._names.get(camera_id)
+            for camera_id in wanted
+        }
+
+
+camera_names = CameraNameCache()
@@ -0,0 +1,188 @@
+"""Filters, keyset pagination and projection for event listings.
+
+Events are listed newest first by (created_at, _id). A page ends with an
+opaque cursor naming its last event; the next page starts strictly after
+it, so pages stay stable while new events arrive and cost the same no
+matter how deep into history they are:
+
+    GET /events?limit=50                        -> X-Next-Cursor: <cursor>
+    GET /events?limit=50&cursor=<cursor>
+    GET /events?since=...&until=...&bbox=south,west,north,east
+    GET /events?fields=id,title,lat,lng,status  (projection for list views)
+"""
+
+import base64
+import binascii
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+
+EVENTS_PAGE_SIZE = int(os.getenv("EVENTS_PAGE_SIZE", "200"))
+EVENTS_PAGE_SIZE_MAX = int(os.getenv("EVENTS_PAGE_SIZE_MAX", "1000"))
+
+# Response field -> stored field
+EVENT_FIELDS = {
+    "id": "_id",
+    "severity": "severity",
+    "title": "title",
+    "description": "description",
+    "reference_clip_url": "reference_clip_url",
+    "lat": "lat",
+    "lng": "lng",
+    "camera_id": "camera_id",
+    "camera_name": "camera_id",
+    "ambulance_id": "ambulance_id",
+    "status": "status",
+    "created_at": "created_at",
+    "resolved_at": "resolved_at",
+}
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+Cursor = tuple[datetime, PydanticObjectId]
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """MongoDB stores UTC at millisecond precision; compare the same way."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def encode_cursor(created_at: datetime, event_id: PydanticObjectId) -> str:
+    millis = (_naive_utc(created_at) - _EPOCH) // timedelta(milliseconds=1)
+    return base64.urlsafe_b64encode(f"{millis}:{event_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        millis, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return _EPOCH + timedelta(milliseconds=int(millis)), PydanticObjectId(event_id)
+    except (binascii.Error, UnicodeDecodeError, InvalidId, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def parse_bbox(value: Optional[str]) -> Optional[tuple[float, float, float, float]]:
+    """"south,west,north,east" (west > east crosses the antimeridian)."""
+    if value is None:
+        return None
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox must be south,west,north,east")
+    south, west, north, east = (float(part) for part in parts)
+    if south > north:
+        raise ValueError("bbox south must not exceed north")
+    return south, west, north, east
+
+
+def parse_fields(value: Optional[str]) -> Optional[list[str]]:
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = set(fields) - EVENT_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+@dataclass(frozen=True)
+class EventQuery:
+    status: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    bbox: Optional[tuple[float, float, float, float]] = None
+    after: Optional[Cursor] = None
+    limit: int = EVENTS_PAGE_SIZE
+    fields: Optional[list[str]] = None
+
+    def mongo_filter(self) -> dict[str, Any]:
+        clauses: list[dict[str, Any]] = []
+        if self.status is not None:
+            clauses.append({"status": self.status})
+        created: dict[str, datetime] = {}
+        if self.since is not None:
+            created["$gte"] = _naive_utc(self.since)
+        if self.until is not None:
+            created["$lt"] = _naive_utc(self.until)
+        if created:
+            clauses.append({"created_at": created})
+        if self.bbox is not None:
+            south, west, north, east = self.bbox
+            clauses.append({"lat": {"$gte": south, "$lte": north}})
+            if west <= east:
+                clauses.append({"lng": {"$gte": west, "$lte": east}})
+            else:
+                clauses.append({"$or": [{"lng": {"$gte": west}}, {"lng": {"$lte": east}}]})
+        if self.after is not None:
+            created_at, event_id = self.after
+            clauses.append(
+                {
+                    "$or": [
+                        {"created_at": {"$lt": created_at}},
+                        {"created_at": created_at, "_id": {"$lt": event_id}},
+                    ]
+                }
+            )
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def projection(self) -> Optional[dict[str, int]]:
+        if self.fields is None:
+            return None
+        # created_at and _id are always needed for the cursor
+        stored = {EVENT_FIELDS[field] for field in self.fields} | {"created_at", "_id"}
+        return {field: 1 for field in stored}
+
+    def matches(self, event: dict[str, Any]) -> bool:
+        """The in-memory equivalent of mongo_filter, for cached events."""
+        if self.status is not None and event["status"] != self.status:
+            return False
+        created_at = _naive_utc(event["created_at"])
+        if self.since is not None and created_at < _naive_utc(self.since):
+            return False
+        if self.until is not None and created_at >= _naive_utc(self.until):
+            return False
+        if self.bbox is not None:
+            south, west, north, east = self.bbox
+            lat, lng = event["lat"], event["lng"]
+            if not south <= lat <= north:
+                return False
+            if west <= east and not west <= lng <= east:
+                return False
+            if west > east and not (lng >= west or lng <= east):
+                return False
+        if self.after is not None and sort_key(event) >= self.after:
+            return False
+        return True
+
+
+def sort_key(event: dict[str, Any]) -> Cursor:
+    return _naive_utc(event["created_at"]), event["_id"]
+
+
+def to_response(event: dict[str, Any], camera_name: Optional[str]) -> dict[str, Any]:
+    """Stored event (possibly projected) -> response fields present in it."""
+    response: dict[str, Any] = {}
+    for field, stored in EVENT_FIELDS.items():
+        if stored not in event:
+            continue
+        value = event[stored]
+        if field == "camera_name":
+            value = camera_name
+        elif field in ("id", "camera_id", "ambulance_id") and value is not None:
+            value = str(value)
+        response[field] = getattr(value, "value", value)
+    return response
+
+
+def select(responses: Iterable[dict[str, Any]], fields: Optional[list[str]]):
+    if fields is None:
+        return list(responses)
+    return [{field: r[field] for field in fields if field in r} for r in responses]
@@ -0,0 +1,66 @@
+"""Vectorized great-circle distance helpers shared by dispatch and ranking code."""
+
+from typing import Sequence
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+ArrayLike = float | Sequence[float] | np.ndarray
+
+
+def haversine_km(
+    lat1: ArrayLike, lng1: ArrayLike, lat2: ArrayLike, lng2: ArrayLike
+) -> np.ndarray:
+    """Element-wise haversine distance in kilometers; inputs broadcast like NumPy."""
+    lat1 = np.radians(lat1)
+    lng1 = np.radians(lng1)
+    lat2 = np.radians(lat2)
+    lng2 = np.radians(lng2)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def calculate_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Calculate distance between two points in kilometers (Haversine formula)."""
+    return float(haversine_km(lat1, lng1, lat2, lng2))
+
+
+def distances_from(
+    lat: float, lng: float, lats: ArrayLike, lngs: ArrayLike
+) -> np.ndarray:
+    """One-to-many: distances from (lat, lng) to every point in lats/lngs."""
+    return haversine_km(
+        lat, lng, np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+    )
+
+
+def distance_matrix(
+    src_lats: ArrayLike, src_lngs: ArrayLike, dst_lats: ArrayLike, dst_lngs: ArrayLike
+) -> np.ndarray:
+    """Many-to-many: an (n_src, n_dst) matrix of distances in kilometers."""
+    src_lats = np.asarray(src_lats, dtype=float)[:, None]
+    src_lngs = np.asarray(src_lngs, dtype=float)[:, None]
+    dst_lats = np.asarray(dst_lats, dtype=float)[None, :]
+    dst_lngs = np.asarray(dst_lngs, dtype=float)[None, :]
+    return haversine_km(src_lats, src_lngs, dst_lats, dst_lngs)
+
+
+def nearest_k(
+    lat: float, lng: float, lats: ArrayLike, lngs: ArrayLike, k: int = 1
+) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and distances of the k points closest to (lat, lng), nearest first."""
+    distances = distances_from(lat, lng, lats, lngs)
+    k = min(k, distances.size)
+    if k <= 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=float)
+    if k < distances.size:
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(distances.size)
+    order = candidates[np.argsort(distances[candidates], kind="stable")]
+    return order, distances[order]
@@ -0,0 +1,205 @@
+"""Background jobs for work that outlives the request that started it.
+
+Endpoints submit a job and return its id right away; the job runs on the
+event loop under a per-kind concurrency limit and can be listed, inspected
+and cancelled through /jobs. Finished jobs are kept for a while so their
+outcome can still be read.
+
+    job = job_runner.submit("simulate", simulate_ambulance, ambulance.id,
+                            key=str(ambulance.id))
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Jobs of one kind running at once; the rest wait as "queued"
+JOB_MAX_CONCURRENT = int(os.getenv("JOB_MAX_CONCURRENT", "100"))
+# Finished jobs kept for status queries
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "500"))
+# How long shutdown waits for running jobs before cancelling them
+JOB_SHUTDOWN_GRACE_S = float(os.getenv("JOB_SHUTDOWN_GRACE_S", "5"))
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+@dataclass
+class Job:
+    kind: str
+    # Jobs with the same kind and key are not run twice at once
+    key: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Any = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    def __init__(
+        self,
+        max_concurrent: int = JOB_MAX_CONCURRENT,
+        history_size: int = JOB_HISTORY_SIZE,
+    ) -> None:
+        self.max_concurrent = max(max_concurrent, 1)
+        self.history_size = history_size
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._active_keys: dict[tuple[str, str], Job] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._closing = False
+
+    @property
+    def closing(self) -> bool:
+        """True once close() has started; submit() then raises."""
+        return self._closing
+
+    def submit(
+        self,
+        kind: str,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,
+        key: Optional[str] = None,
+        replace: bool = False,
+    ) -> Job:
+        """Start func(*args) in the background; returns the job immediately.
+
+        If a job of this kind and key is already queued or running, that job
+        is returned instead of starting another; with replace=True it is
+        cancelled and a new one started.
+        """
+        if self._closing:
+            raise RuntimeError("Job runner is shutting down")
+        if key is not None:
+            existing = self._active_keys.get((kind, key))
+            if existing is not None and not replace:
+                return existing
+            if existing is not None:
+                self.cancel(existing.id)
+        job = Job(kind=kind, key=key)
+        self._jobs[job.id] = job
+        if key is not None:
+            self._active_keys[(kind, key)] = job
+        job.task = asyncio.create_task(self._run(job, func, args))
+        job.task.add_done_callback(lambda _: self._settle(job))
+        self._trim()
+        return job
+
+    async def _run(
+        self, job: Job, func: Callable[..., Awaitable[Any]], args: tuple
+    ) -> None:
+        limit = self._limits.setdefault(job.kind, asyncio.Semaphore(self.max_concurrent))
+        try:
+            async with limit:
+                job.status = JobStatus.RUNNING
+                job.started_at = datetime.utcnow()
+                job.result = await func(*args)
+            job.status = JobStatus.SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.status = JobStatus.FAILED
+            job.error = str(e) or type(e).__name__
+        finally:
+            self._settle(job)
+
+    def _settle(self, job: Job) -> None:
+        # Also runs for tasks cancelled before they started, which never
+        # enter _run
+        if job.active:
+            job.status = JobStatus.CANCELLED
+        if job.finished_at is None:
+            job.finished_at = datetime.utcnow()
+        if job.key is not None and self._active_keys.get((job.kind, job.key)) is job:
+            del self._active_keys[(job.kind, job.key)]
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[: max(len(finished) - self.history_size, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def active(self, kind: str, key: str) -> Optional[Job]:
+        """The queued or running job of this kind and key, if any."""
+        return self._active_keys.get((kind, key))
+
+    def find(
+        self, kind: Optional[str] = None, status: Optional[JobStatus] = None
+    ) -> list[Job]:
+        """Jobs newest first, optionally filtered."""
+        return [
+            job
+            for job in reversed(self._jobs.values())
+            if (kind is None or job.kind == kind)
+            and (status is None or job.status == status)
+        ]
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; False if the job is unknown or already done."""
+        job = self._jobs.get(job_id)
+        if job is None or not job.active or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    async def close(self, grace_s: float = JOB_SHUTDOWN_GRACE_S) -> None:
+        """Stop taking jobs, let running ones finish briefly, cancel the rest."""
+        self._closing = True
+        tasks = [job.task for job in self._jobs.values() if job.active and job.task]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=grace_s)
+        if pending:
+            logger.info("Cancelling %s unfinished background jobs", len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        counts: dict[str, dict[str, int]] = {}
+        for job in self._jobs.values():
+            by_status = counts.setdefault(job.kind, {})
+            by_status[job.status.value] = by_status.get(job.status.value, 0) + 1
+        return {"max_concurrent": self.max_concurrent, "jobs": counts}
+
+
+job_runner = JobRunner()
@@ -0,0 +1,32 @@
+"""Fast JSON encoding for API responses and live broadcasts (orjson)."""
+
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        # Same field names as FastAPI's response serialization ("_id")
+        return obj.model_dump(by_alias=True)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; accepts documents and models as-is.
+
+    Return it directly from a route so FastAPI skips its own validation and
+    encoding pass over response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,234 @@
+"""Backplane that carries live-update marks to every worker.
+
+broadcast_all / broadcast_documents publish a mark here instead of touching
+the local scheduler directly. Every worker's handler (this one's included)
+receives it and schedules the broadcast to its own WebSocket clients.
+
+    LIVE_BUS_URL unset             in-process only (single worker)
+    LIVE_BUS_URL=redis://host:6379 Redis pub/sub on LIVE_BUS_CHANNEL
+
+The Redis backend speaks plain RESP, so any Redis-compatible server works;
+stub_pubsub_server.py is a local stand-in for development and tests.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Callable, Optional
+from urllib.parse import urlparse
+
+import orjson
+
+from utils.json_codec import dumps
+
+logger = logging.getLogger(__name__)
+
+LIVE_BUS_URL = os.getenv("LIVE_BUS_URL") or None
+LIVE_BUS_CHANNEL = os.getenv("LIVE_BUS_CHANNEL", "lifeline:live")
+LIVE_BUS_OUTBOX_SIZE = int(os.getenv("LIVE_BUS_OUTBOX_SIZE", "10000"))
+LIVE_BUS_RECONNECT_MAX_S = float(os.getenv("LIVE_BUS_RECONNECT_MAX_S", "10"))
+
+# handler(message, local): local messages may carry live objects, remote
+# ones are decoded JSON. {"resync": True} means remote marks may be lost.
+Handler = Callable[[dict[str, Any], bool], None]
+
+
+class LiveBusError(Exception):
+    pass
+
+
+class LiveBus:
+    """In-process bus: delivers every mark straight to the local handler."""
+
+    def __init__(self) -> None:
+        self._handler: Optional[Handler] = None
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    def _deliver(self, message: dict[str, Any], local: bool) -> None:
+        if self._handler is None:
+            return
+        try:
+            self._handler(message, local)
+        except Exception:
+            logger.exception("Live bus handler failed for %s", message.get("type"))
+
+    def publish(self, message: dict[str, Any]) -> None:
+        self._deliver(message, True)
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": "local"}
+
+
+def encode_command(*args: Any) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    if prefix == b"-":
+        raise LiveBusError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise LiveBusError(f"Unexpected reply: {line!r}")
+
+
+class RedisLiveBus(LiveBus):
+    """Pub/sub over the Redis protocol, one channel shared by all workers.
+
+    Local marks are delivered immediately and also published; messages that
+    come back from this worker are ignored. Publishing never blocks callers:
+    marks queue in an outbox drained by a pipelined publisher task.
+    """
+
+    def __init__(self, url: str, channel: str = LIVE_BUS_CHANNEL) -> None:
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._outbox: asyncio.Queue[bytes] = asyncio.Queue(LIVE_BUS_OUTBOX_SIZE)
+        self._tasks: list[asyncio.Task] = []
+        self._subscribed = asyncio.Event()
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def publish(self, message: dict[str, Any]) -> None:
+        self._deliver(message, True)
+        try:
+            self._outbox.put_nowait(dumps({"origin": self.origin, **message}))
+        except asyncio.QueueFull:
+            # Receivers repair this with their periodic snapshots
+            self.dropped += 1
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._publish_loop()),
+            asyncio.create_task(self._subscribe_loop()),
+        ]
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            logger.warning("Live bus not subscribed yet (%s:%s)", self.host, self.port)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    async def _with_reconnect(self, name: str, session) -> None:
+        delay = 0.5
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                delay = 0.5
+                await session(reader, writer)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError, LiveBusError) as e:
+                logger.warning("Live bus %s connection lost: %s", name, e)
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LIVE_BUS_RECONNECT_MAX_S)
+
+    async def _publish_loop(self) -> None:
+        async def session(reader, writer):
+            while True:
+                batch = [await self._outbox.get()]
+                while not self._outbox.empty() and len(batch) < 256:
+                    batch.append(self._outbox.get_nowait())
+                writer.write(
+                    b"".join(encode_command("PUBLISH", self.channel, m) for m in batch)
+                )
+                await writer.drain()
+                for _ in batch:
+                    await read_reply(reader)
+                self.published += len(batch)
+
+        await self._with_reconnect("publish", session)
+
+    async def _subscribe_loop(self) -> None:
+        async def session(reader, writer):
+            writer.write(encode_command("SUBSCRIBE", self.channel))
+            await writer.drain()
+            await read_reply(reader)
+            if self._subscribed.is_set():
+                # Marks published while we were away are gone
+                self._deliver({"resync": True}, False)
+            self._subscribed.set()
+            while True:
+                reply = await read_reply(reader)
+                if not isinstance(reply, list) or reply[0] != b"message":
+                    continue
+                try:
+                    message = orjson.loads(reply[2])
+                except orjson.JSONDecodeError:
+                    continue
+                if message.pop("origin", None) == self.origin:
+                    continue
+                self.received += 1
+                self._deliver(message, False)
+
+        await self._with_reconnect("subscribe", session)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "redis",
+            "channel": self.channel,
+            "subscribed": self._subscribed.is_set(),
+            "outbox": self._outbox.qsize(),
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+def create_live_bus(url: Optional[str] = LIVE_BUS_URL) -> LiveBus:
+    if not url:
+        return LiveBus()
+    if urlparse(url).scheme not in ("redis", "tcp"):
+        raise ValueError(f"Unsupported LIVE_BUS_URL: {url}")
+    return RedisLiveBus(url)
+
+
+live_bus = create_live_bus()
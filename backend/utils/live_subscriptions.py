@@ -0,0 +1,237 @@
+"""Topic and viewport subscriptions for /ws/live.
+
+A client that never subscribes receives everything. After a subscribe
+message it receives only the entity types it asked for, located inside its
+bounding box:
+
+    {"type": "subscribe", "types": ["ambulances", "events"],
+     "bbox": [south, west, north, east], "zoom": 11}
+
+Entities leaving the box are sent as deletes. With a zoom below
+LIVE_DECIMATE_BELOW_ZOOM, moves too small to see at that zoom are skipped.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, Hashable, Iterable, Optional
+
+LIVE_SUBSCRIPTION_CELL_DEG = float(os.getenv("LIVE_SUBSCRIPTION_CELL_DEG", "0.05"))
+# Boxes spanning more cells than this are checked against every update
+LIVE_SUBSCRIPTION_MAX_CELLS = int(os.getenv("LIVE_SUBSCRIPTION_MAX_CELLS", "400"))
+LIVE_DECIMATE_BELOW_ZOOM = float(os.getenv("LIVE_DECIMATE_BELOW_ZOOM", "13"))
+# Moves under this many screen pixels are not sent to decimated clients
+LIVE_DECIMATE_PIXELS = float(os.getenv("LIVE_DECIMATE_PIXELS", "2"))
+
+# Fields that change as a vehicle moves; changes to anything else always go out
+POSITION_FIELDS = frozenset(
+    {"lat", "lng", "location", "path_index", "eta_seconds", "updated_at", "version"}
+)
+
+BBox = tuple[float, float, float, float]
+EntityKey = tuple[str, str]
+
+
+@dataclass(frozen=True)
+class Subscription:
+    types: frozenset[str]
+    bbox: Optional[BBox] = None
+    zoom: Optional[float] = None
+
+    @classmethod
+    def parse(cls, message: dict[str, Any], known_types: Iterable[str]) -> "Subscription":
+        """Build from a subscribe message; raises ValueError on bad input."""
+        known = frozenset(known_types)
+        types = message.get("types")
+        if types is not None and not isinstance(types, list):
+            raise ValueError("types must be a list of entity types")
+        types = known if types is None else frozenset(types) & known
+
+        bbox = message.get("bbox")
+        if bbox is not None:
+            if len(bbox) != 4:
+                raise ValueError("bbox must be [south, west, north, east]")
+            south, west, north, east = (float(v) for v in bbox)
+            if south > north:
+                raise ValueError("bbox south must not exceed north")
+            bbox = (south, west, north, east)
+
+        zoom = message.get("zoom")
+        return cls(types, bbox, None if zoom is None else float(zoom))
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if self.bbox is None:
+            return True
+        south, west, north, east = self.bbox
+        if not south <= lat <= north:
+            return False
+        if west <= east:
+            return west <= lng <= east
+        # Box crossing the antimeridian
+        return lng >= west or lng <= east
+
+    def min_move_deg(self) -> float:
+        """Smallest move worth sending at this zoom (0: send every move)."""
+        if self.zoom is None or self.zoom >= LIVE_DECIMATE_BELOW_ZOOM:
+            return 0.0
+        # Web Mercator: 256 px span 360 degrees at zoom 0
+        return LIVE_DECIMATE_PIXELS * 360 / (256 * 2**self.zoom)
+
+
+class ClientView:
+    """What one subscribed client has been sent, used to filter new frames."""
+
+    def __init__(self, subscription: Subscription) -> None:
+        self.subscription = subscription
+        # Last entity state sent, per visible entity
+        self.visible: dict[EntityKey, dict[str, Any]] = {}
+
+    def _skip_move(self, previous: dict[str, Any], entity: dict[str, Any]) -> bool:
+        threshold = self.subscription.min_move_deg()
+        if threshold <= 0:
+            return False
+        if abs(entity["lat"] - previous["lat"]) >= threshold:
+            return False
+        if abs(entity["lng"] - previous["lng"]) >= threshold:
+            return False
+        return all(
+            previous.get(field) == value
+            for field, value in entity.items()
+            if field not in POSITION_FIELDS
+        )
+
+    def filter(
+        self, updates: list[dict[str, Any]], index: "SubscriberIndex", owner: Hashable
+    ) -> list[dict[str, Any]]:
+        """The part of a frame's updates this client should see."""
+        subscription = self.subscription
+        filtered = []
+        for update in updates:
+            entity_type = update["type"]
+            if entity_type not in subscription.types:
+                continue
+
+            if update["op"] == "snapshot":
+                for key in [k for k in self.visible if k[0] == entity_type]:
+                    self._hide(key, index, owner)
+                data = []
+                for entity in update["data"]:
+                    if subscription.contains(entity["lat"], entity["lng"]):
+                        self._show((entity_type, entity["id"]), entity, index, owner)
+                        data.append(entity)
+                filtered.append({"type": entity_type, "op": "snapshot", "data": data})
+                continue
+
+            upserts = []
+            deletes = []
+            for entity in update["upserts"]:
+                key = (entity_type, entity["id"])
+                previous = self.visible.get(key)
+                if subscription.contains(entity["lat"], entity["lng"]):
+                    if previous is not None and self._skip_move(previous, entity):
+                        continue
+                    self._show(key, entity, index, owner)
+                    upserts.append(entity)
+                elif previous is not None:
+                    # Left the viewport
+                    self._hide(key, index, owner)
+                    deletes.append(entity["id"])
+            for entity_id in update["deletes"]:
+                key = (entity_type, entity_id)
+                if key in self.visible:
+                    self._hide(key, index, owner)
+                    deletes.append(entity_id)
+            if upserts or deletes:
+                filtered.append(
+                    {
+                        "type": entity_type,
+                        "op": "delta",
+                        "upserts": upserts,
+                        "deletes": deletes,
+                    }
+                )
+        return filtered
+
+    def _show(self, key, entity, index: "SubscriberIndex", owner: Hashable) -> None:
+        self.visible[key] = entity
+        index.viewers.setdefault(key, set()).add(owner)
+
+    def _hide(self, key, index: "SubscriberIndex", owner: Hashable) -> None:
+        self.visible.pop(key, None)
+        viewers = index.viewers.get(key)
+        if viewers is not None:
+            viewers.discard(owner)
+            if not viewers:
+                del index.viewers[key]
+
+    def clear(self, index: "SubscriberIndex", owner: Hashable) -> None:
+        for key in list(self.visible):
+            self._hide(key, index, owner)
+
+
+class SubscriberIndex:
+    """Grid of subscriber viewports, for finding who may see a location.
+
+    Also tracks which subscribers currently show each entity, so that moves
+    out of a viewport and deletions reach them.
+    """
+
+    def __init__(self, cell_deg: float = LIVE_SUBSCRIPTION_CELL_DEG) -> None:
+        self.cell_deg = cell_deg
+        self._cells: dict[tuple[int, int], set[Hashable]] = {}
+        self._cells_of: dict[Hashable, list[tuple[int, int]]] = {}
+        # Subscribers without a box, or with one too large to grid
+        self._everywhere: set[Hashable] = set()
+        self.viewers: dict[EntityKey, set[Hashable]] = {}
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _box_cells(self, bbox: BBox) -> Optional[list[tuple[int, int]]]:
+        south, west, north, east = bbox
+        if west > east:
+            return None
+        (i0, j0), (i1, j1) = self._cell(south, west), self._cell(north, east)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > LIVE_SUBSCRIPTION_MAX_CELLS:
+            return None
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def add(self, subscriber: Hashable, subscription: Subscription) -> None:
+        self.remove(subscriber)
+        cells = None if subscription.bbox is None else self._box_cells(subscription.bbox)
+        if cells is None:
+            self._everywhere.add(subscriber)
+            return
+        self._cells_of[subscriber] = cells
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(subscriber)
+
+    def remove(self, subscriber: Hashable) -> None:
+        self._everywhere.discard(subscriber)
+        for cell in self._cells_of.pop(subscriber, ()):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(subscriber)
+                if not bucket:
+                    del self._cells[cell]
+
+    def near(self, lat: float, lng: float) -> set[Hashable]:
+        """Subscribers whose viewport may contain the point."""
+        return self._cells.get(self._cell(lat, lng), set()) | self._everywhere
+
+    def candidates(self, updates: list[dict[str, Any]]) -> set[Hashable]:
+        """Subscribers that may be affected by a frame's updates."""
+        found: set[Hashable] = set()
+        for update in updates:
+            entity_type = update["type"]
+            if update["op"] == "snapshot":
+                return self.all()
+            for entity in update["upserts"]:
+                found |= self.near(entity["lat"], entity["lng"])
+                found |= self.viewers.get((entity_type, entity["id"]), set())
+            for entity_id in update["deletes"]:
+                found |= self.viewers.get((entity_type, entity_id), set())
+        return found
+
+    def all(self) -> set[Hashable]:
+        return set(self._cells_of) | self._everywhere
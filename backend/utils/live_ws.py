@@ -1,60 +1,641 @@
+import asyncio
 import logging
-from typing import Any
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Iterable, Optional
 
+from beanie import Document, PydanticObjectId
+from beanie.operators import In
 from fastapi import WebSocket
-from fastapi.encoders import jsonable_encoder
 
-from models import Ambulance, Event, Camera
+from models import Ambulance, Event, EventStatus, Camera
+from utils.camera_names import camera_names
+from utils.event_query import SORT, EventQuery
+from utils.json_codec import dumps
+from utils.live_bus import live_bus
+from utils.live_subscriptions import ClientView, SubscriberIndex, Subscription
+from utils.position_stream import position_stream
+from utils.state_cache import state_cache
 
 logger = logging.getLogger(__name__)
 
+# Deltas are followed by a full snapshot of the type at most this often
+LIVE_SNAPSHOT_INTERVAL_S = float(os.getenv("LIVE_SNAPSHOT_INTERVAL_S", "30"))
+# Changes are coalesced and sent at most once per tick
+LIVE_BROADCAST_TICK_MS = int(os.getenv("LIVE_BROADCAST_TICK_MS", "75"))
+# Frames buffered per client before the slow-client policy applies
+LIVE_CLIENT_QUEUE_SIZE = int(os.getenv("LIVE_CLIENT_QUEUE_SIZE", "32"))
+# "coalesce": merge the backlog into one frame; "disconnect": drop the client
+LIVE_SLOW_CLIENT_POLICY = os.getenv("LIVE_SLOW_CLIENT_POLICY", "coalesce")
+# Recent frames kept for clients resuming after a reconnect
+LIVE_HISTORY_SIZE = int(os.getenv("LIVE_HISTORY_SIZE", "1024"))
+# Resolved events included in an events snapshot, newest first; older ones
+# are paged through GET /events
+LIVE_SNAPSHOT_RESOLVED_EVENTS = int(os.getenv("LIVE_SNAPSHOT_RESOLVED_EVENTS", "200"))
 
-async def broadcast_all(type: str):
-    """Broadcast the current state of all ambulances to connected clients."""
-    if type == "ambulances":
-        all_ambulances = await Ambulance.find_all().to_list()
-        print("Broadcasting ambulances:", all_ambulances)
-        await broadcast_update("ambulances", all_ambulances)
-    if type == "events":
-        all_events = await Event.find_all().to_list()
-        await broadcast_update("events", all_events)
-    if type == "cameras":
-        all_cameras = await Camera.find_all().to_list()
-        await broadcast_update("cameras", all_cameras)
+ENTITY_MODELS: dict[str, type[Document]] = {
+    "ambulances": Ambulance,
+    "events": Event,
+    "cameras": Camera,
+}
+
+
+class LiveState:
+    """Sequence numbers and per-entity versions for the live protocol.
+
+    Every broadcast frame gets the next sequence number. An entity's version is the
+    sequence number of the last frame that changed it, so clients can drop
+    stale upserts and detect gaps (seq != last seq + 1) to ask for a resync.
+    """
+
+    def __init__(self) -> None:
+        # Sequence numbers are only comparable within one server run
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self._versions: dict[str, dict[str, int]] = {t: {} for t in ENTITY_MODELS}
+        self._last_snapshot: dict[str, float] = {t: 0.0 for t in ENTITY_MODELS}
+
+    def next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def stamp(self, entity_type: str, ids: Iterable[str], seq: int) -> None:
+        versions = self._versions[entity_type]
+        for entity_id in ids:
+            versions[entity_id] = seq
+
+    def forget(self, entity_type: str, ids: Iterable[str]) -> None:
+        versions = self._versions[entity_type]
+        for entity_id in ids:
+            versions.pop(entity_id, None)
+
+    def version(self, entity_type: str, entity_id: str) -> int:
+        return self._versions[entity_type].get(entity_id, 0)
+
+    def snapshot_due(self, entity_type: str) -> bool:
+        return time.monotonic() - self._last_snapshot[entity_type] >= LIVE_SNAPSHOT_INTERVAL_S
+
+    def mark_snapshot(self, entity_type: str) -> None:
+        self._last_snapshot[entity_type] = time.monotonic()
+
+
+live_state = LiveState()
+
+
+class LiveHistory:
+    """Ring buffer of the most recent broadcast frames, for resuming clients."""
+
+    def __init__(self, size: int = LIVE_HISTORY_SIZE) -> None:
+        self._frames: deque[dict[str, Any]] = deque(maxlen=max(size, 1))
+
+    def append(self, payload: dict[str, Any]) -> None:
+        self._frames.append(payload)
+
+    def since(self, last_seq: int) -> Optional[list[dict[str, Any]]]:
+        """Frames after last_seq, or None when some were already evicted."""
+        if last_seq > live_state.seq:
+            return None
+        if last_seq == live_state.seq:
+            return []
+        if not self._frames or self._frames[0]["seq"] > last_seq + 1:
+            return None
+        return [frame for frame in self._frames if frame["seq"] > last_seq]
+
+
+live_history = LiveHistory()
+
+
+def _encode_entity(entity_type: str, document: Document) -> dict[str, Any]:
+    data = document.model_dump(by_alias=True)
+    if isinstance(document, Ambulance):
+        # Where the timed route puts the unit now; clients animate from here
+        data.update(document.motion_fields())
+    entity_id = str(document.id)
+    data["id"] = entity_id
+    data["version"] = live_state.version(entity_type, entity_id)
+    return data
+
+
+async def _snapshot_events() -> list[Event]:
+    """Every live event plus the most recent resolved ones.
+
+    Live events come from the state cache; resolved ones are one bounded,
+    index-backed page, so the cost does not grow with history.
+    """
+    live = state_cache.cached(Event)
+    if live is None:
+        live = await Event.find(Event.status != EventStatus.RESOLVED).to_list()
+    query = EventQuery(
+        status=EventStatus.RESOLVED.value, limit=LIVE_SNAPSHOT_RESOLVED_EVENTS
+    )
+    resolved = (
+        await Event.find(query.mongo_filter()).sort(SORT).limit(query.limit).to_list()
+    )
+    return live + resolved
+
+
+async def snapshot_message(entity_type: str) -> dict[str, Any]:
+    """Full state of one entity type (recent history only for events)."""
+    model = ENTITY_MODELS[entity_type]
+    if model is Event:
+        documents = await _snapshot_events()
+    else:
+        documents = await state_cache.find_all(model)
+    return {
+        "type": entity_type,
+        "op": "snapshot",
+        "data": [_encode_entity(entity_type, doc) for doc in documents],
+    }
+
+
+async def send_snapshots(websocket: WebSocket) -> None:
+    """Bring a (re)connecting client up to date."""
+    # Taken before the reads: anything newer arrives with a higher seq
+    seq = live_state.seq
+    updates = [await snapshot_message(entity_type) for entity_type in ENTITY_MODELS]
+    manager.send(websocket, {"seq": seq, "epoch": live_state.epoch, "updates": updates})
+
+
+async def resume_or_snapshot(
+    websocket: WebSocket, epoch: Optional[str] = None, last_seq: Optional[int] = None
+) -> None:
+    """Replay what a reconnecting client missed, or snapshot if that is gone.
+
+    Replay needs the same server run (epoch) and a gap still covered by the
+    history; it goes out as one merged frame.
+    """
+    frames = None
+    if epoch == live_state.epoch and last_seq is not None:
+        frames = live_history.since(last_seq)
+    if frames is None:
+        await send_snapshots(websocket)
+        return
+    manager.resume(websocket, last_seq, frames)
+
+
+class BroadcastScheduler:
+    """Coalesces live updates and flushes them at most once per tick.
+
+    Changes are only marked here. A flush runs one query per dirty entity
+    type (none for documents the caller already passed in) and sends a
+    single frame {seq, updates: [...]} to every client.
+    """
+
+    def __init__(self, tick_ms: int = LIVE_BROADCAST_TICK_MS) -> None:
+        self.tick_s = tick_ms / 1000
+        self._ids: dict[str, set[PydanticObjectId]] = {}
+        self._documents: dict[str, dict[PydanticObjectId, Document]] = {}
+        self._snapshots: set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _schedule(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_tick())
+
+    def mark_dirty(
+        self, entity_type: str, ids: Optional[Iterable[PydanticObjectId]] = None
+    ) -> None:
+        if entity_type not in ENTITY_MODELS:
+            return
+        if ids is None:
+            self._snapshots.add(entity_type)
+        else:
+            self._ids.setdefault(entity_type, set()).update(ids)
+        self._schedule()
+
+    def mark_documents(self, entity_type: str, documents: Iterable[Document]) -> None:
+        if entity_type not in ENTITY_MODELS:
+            return
+        held = self._documents.setdefault(entity_type, {})
+        for document in documents:
+            held[document.id] = document
+        self._schedule()
+
+    def _has_pending(self) -> bool:
+        return bool(self._ids or self._documents or self._snapshots)
+
+    async def _flush_after_tick(self) -> None:
+        # Keeps ticking while changes arrive during a flush
+        while True:
+            await asyncio.sleep(self.tick_s)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Live broadcast flush failed")
+            if not self._has_pending():
+                return
+
+    async def flush(self) -> None:
+        ids, self._ids = self._ids, {}
+        documents, self._documents = self._documents, {}
+        snapshots, self._snapshots = self._snapshots, set()
+        dirty = set(ids) | set(documents) | snapshots
+        if not dirty:
+            return
+
+        seq = live_state.next_seq()
+        updates = []
+        for entity_type in ENTITY_MODELS:
+            if entity_type not in dirty:
+                continue
+            held = documents.get(entity_type, {})
+            changed = ids.get(entity_type, set()) | set(held)
+
+            if entity_type in snapshots or live_state.snapshot_due(entity_type):
+                live_state.stamp(entity_type, [str(i) for i in changed], seq)
+                live_state.mark_snapshot(entity_type)
+                updates.append(await snapshot_message(entity_type))
+                continue
+
+            # Documents passed in by callers are current; read only the rest
+            to_read = [i for i in changed if i not in held]
+            found = dict(held)
+            deleted = []
+            if to_read:
+                model = ENTITY_MODELS[entity_type]
+                for doc in await model.find(In(model.id, to_read)).to_list():
+                    state_cache.apply(doc)
+                    found[doc.id] = doc
+                deleted = [str(i) for i in to_read if i not in found]
+
+            live_state.stamp(entity_type, [str(i) for i in found], seq)
+            live_state.forget(entity_type, deleted)
+            updates.append(
+                {
+                    "type": entity_type,
+                    "op": "delta",
+                    "upserts": [_encode_entity(entity_type, d) for d in found.values()],
+                    "deletes": deleted,
+                }
+            )
+
+        _feed_position_stream(updates)
+        payload = {"seq": seq, "updates": updates}
+        live_history.append(payload)
+        manager.broadcast(payload)
+
+
+def _feed_position_stream(updates: list[dict[str, Any]]) -> None:
+    for update in updates:
+        if update["type"] != "ambulances":
+            continue
+        if update["op"] == "snapshot":
+            position_stream.update(update["data"])
+        else:
+            position_stream.update(update["upserts"])
+            position_stream.remove(update["deletes"])
+
+
+def broadcast_all(type: str, ids: Optional[Iterable[PydanticObjectId]] = None):
+    """Schedule a live update.
+
+    With ids, only those documents are re-read and sent as an upsert delta;
+    ids that no longer exist are sent as deletes. Without ids, the full
+    collection is sent. Reaches clients of every worker via the live bus.
+    """
+    if type in ENTITY_MODELS:
+        live_bus.publish({"type": type, "ids": None if ids is None else list(ids)})
+
+
+def broadcast_documents(entity_type: str, documents: Iterable[Document]) -> None:
+    """Schedule a delta for documents the caller already holds (no DB read)."""
+    documents = list(documents)
+    if entity_type in ENTITY_MODELS and documents:
+        live_bus.publish({"type": entity_type, "documents": documents})
+
+
+def _apply_bus_message(message: dict[str, Any], local: bool) -> None:
+    if message.get("resync"):
+        # Marks from other workers may have been missed
+        for entity_type in ENTITY_MODELS:
+            broadcast_scheduler.mark_dirty(entity_type)
+        return
+    entity_type = message["type"]
+    model = ENTITY_MODELS.get(entity_type)
+    if model is None:
+        return
+    if model is Camera and not local:
+        # Names of cameras written on another worker may have changed
+        changed = [doc["_id"] for doc in message.get("documents") or ()]
+        changed = changed or message.get("ids")
+        if changed:
+            for camera_id in changed:
+                camera_names.invalidate(PydanticObjectId(camera_id))
+        else:
+            camera_names.invalidate()
+    documents = message.get("documents")
+    if documents is not None:
+        if not local:
+            documents = [model.model_validate(doc) for doc in documents]
+            for document in documents:
+                state_cache.apply(document)
+        broadcast_scheduler.mark_documents(entity_type, documents)
+        return
+    ids = message.get("ids")
+    if ids is not None and not local:
+        ids = [PydanticObjectId(i) for i in ids]
+    broadcast_scheduler.mark_dirty(entity_type, ids)
+
+
+class Frame:
+    """A broadcast frame, encoded to JSON at most once for all clients.
+
+    Sent as a binary message holding the UTF-8 JSON, so every socket writes
+    the same bytes without re-encoding a text frame.
+    """
+
+    __slots__ = ("payload", "_data")
+
+    def __init__(self, payload: dict[str, Any]) -> None:
+        self.payload = payload
+        self._data: Optional[bytes] = None
+
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = dumps(self.payload)
+        return self._data
+
+
+def merge_frames(frames: list[dict[str, Any]]) -> dict[str, Any]:
+    """Collapse consecutive frames into one with the same end state.
+
+    A snapshot supersedes everything queued before it for its type; deltas
+    keep only the latest upsert or delete per entity. The result spans
+    from_seq..seq so clients do not mistake it for a gap.
+    """
+    merged: dict[str, dict[str, Any]] = {}
+    for frame in frames:
+        for update in frame["updates"]:
+            if update["op"] == "snapshot":
+                merged[update["type"]] = {
+                    "snapshot": update["data"],
+                    "upserts": {},
+                    "deletes": set(),
+                }
+                continue
+            state = merged.setdefault(
+                update["type"], {"snapshot": None, "upserts": {}, "deletes": set()}
+            )
+            for entity in update["upserts"]:
+                state["upserts"][entity["id"]] = entity
+                state["deletes"].discard(entity["id"])
+            for entity_id in update["deletes"]:
+                state["upserts"].pop(entity_id, None)
+                state["deletes"].add(entity_id)
+
+    updates = []
+    for entity_type, state in merged.items():
+        if state["snapshot"] is not None:
+            updates.append(
+                {"type": entity_type, "op": "snapshot", "data": state["snapshot"]}
+            )
+        if state["upserts"] or state["deletes"]:
+            updates.append(
+                {
+                    "type": entity_type,
+                    "op": "delta",
+                    "upserts": list(state["upserts"].values()),
+                    "deletes": sorted(state["deletes"]),
+                }
+            )
+    return {
+        "seq": frames[-1]["seq"],
+        "from_seq": frames[0].get("from_seq", frames[0]["seq"]),
+        "updates": updates,
+    }
+
+
+class LiveClient:
+    """One connection with a bounded outbound queue drained by a writer task."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int = LIVE_CLIENT_QUEUE_SIZE,
+        policy: str = LIVE_SLOW_CLIENT_POLICY,
+    ) -> None:
+        self.websocket = websocket
+        self.max_queue = max(max_queue, 1)
+        self.policy = policy
+        self._queue: deque[tuple[float, Frame]] = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.connected_at = time.monotonic()
+        self.frames_sent = 0
+        self.frames_coalesced = 0
+        self.last_lag_s = 0.0
+        self.max_lag_s = 0.0
+        # Set once the client subscribes; None receives everything
+        self.view: Optional[ClientView] = None
+        self.last_seq = 0
+
+    def start(self, on_error) -> None:
+        self._writer = asyncio.create_task(self._write_loop(on_error))
+
+    def stop(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Queue a frame; False when the client is too slow and must go."""
+        now = time.monotonic()
+        self.last_seq = max(self.last_seq, frame.payload["seq"])
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                return False
+            frames = [queued.payload for _, queued in self._queue] + [frame.payload]
+            self.frames_coalesced += len(frames) - 1
+            # Keep the age of the oldest frame so lag stays visible
+            merged = Frame(merge_frames(frames))
+            self._queue = deque([(self._queue[0][0], merged)])
+        else:
+            self._queue.append((now, frame))
+        self._ready.set()
+        return True
+
+    async def _write_loop(self, on_error) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    enqueued_at, frame = self._queue.popleft()
+                    await self.websocket.send_bytes(frame.data())
+                    self.frames_sent += 1
+                    self.last_lag_s = time.monotonic() - enqueued_at
+                    self.max_lag_s = max(self.max_lag_s, self.last_lag_s)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await on_error(self.websocket)
+
+    def stats(self) -> dict[str, Any]:
+        oldest = self._queue[0][0] if self._queue else None
+        return {
+            "queue_depth": len(self._queue),
+            "queued_for_s": round(time.monotonic() - oldest, 3) if oldest else 0.0,
+            "last_lag_s": round(self.last_lag_s, 3),
+            "max_lag_s": round(self.max_lag_s, 3),
+            "frames_sent": self.frames_sent,
+            "frames_coalesced": self.frames_coalesced,
+            "connected_for_s": round(time.monotonic() - self.connected_at, 1),
+            "subscription": self._subscription_stats(),
+        }
+
+    def _subscription_stats(self) -> Optional[dict[str, Any]]:
+        if self.view is None:
+            return None
+        subscription = self.view.subscription
+        return {
+            "types": sorted(subscription.types),
+            "bbox": subscription.bbox,
+            "zoom": subscription.zoom,
+            "visible": len(self.view.visible),
+        }
 
 
 class LiveConnectionManager:
     def __init__(self) -> None:
-        self._connections: set[WebSocket] = set()
+        self._clients: dict[WebSocket, LiveClient] = {}
+        self._closing: set[asyncio.Task] = set()
+        self._subscribers = SubscriberIndex()
 
     async def connect(self, websocket: WebSocket) -> None:
         await websocket.accept()
-        self._connections.add(websocket)
-        logger.info("Live WS connected (%s clients)", len(self._connections))
+        client = LiveClient(websocket)
+        self._clients[websocket] = client
+        client.start(self.disconnect)
+        logger.info("Live WS connected (%s clients)", len(self._clients))
 
     async def disconnect(self, websocket: WebSocket) -> None:
-        self._connections.discard(websocket)
-        logger.info("Live WS disconnected (%s clients)", len(self._connections))
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return
+        self._forget_view(client)
+        client.stop()
+        logger.info("Live WS disconnected (%s clients)", len(self._clients))
+
+    def subscribe(
+        self, websocket: WebSocket, subscription: Optional[Subscription]
+    ) -> bool:
+        """Replace a client's subscription (None: receive everything).
+
+        Returns False when it is unchanged; the client's view is then kept.
+        """
+        client = self._clients.get(websocket)
+        if client is None:
+            return False
+        current = client.view.subscription if client.view is not None else None
+        if subscription == current:
+            return False
+        self._forget_view(client)
+        if subscription is not None:
+            client.view = ClientView(subscription)
+            self._subscribers.add(websocket, subscription)
+        return True
+
+    def _forget_view(self, client: LiveClient) -> None:
+        if client.view is not None:
+            client.view.clear(self._subscribers, client.websocket)
+            self._subscribers.remove(client.websocket)
+            client.view = None
+
+    def _routed(self, client: LiveClient, payload: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """The frame payload filtered for a subscribed client, or None if empty."""
+        updates = client.view.filter(payload["updates"], self._subscribers, client.websocket)
+        if not updates:
+            return None
+        routed = {"seq": payload["seq"], "updates": updates}
+        if "epoch" in payload:
+            routed["epoch"] = payload["epoch"]
+        # Frames filtered out entirely are not a gap for this client
+        if client.last_seq and payload["seq"] > client.last_seq + 1:
+            routed["from_seq"] = client.last_seq + 1
+        return routed
 
-    async def broadcast(self, payload: dict[str, Any]) -> None:
-        if not self._connections:
+    def _enqueue(self, client: LiveClient, frame: Frame) -> None:
+        if not client.enqueue(frame):
+            self._drop_slow_client(client)
+
+    def send(self, websocket: WebSocket, payload: dict[str, Any]) -> None:
+        client = self._clients.get(websocket)
+        if client is None:
             return
-        dead: list[WebSocket] = []
-        for websocket in self._connections:
-            try:
-                await websocket.send_json(payload)
-            except Exception:
-                dead.append(websocket)
-        for websocket in dead:
-            self._connections.discard(websocket)
+        if client.view is not None:
+            payload = self._routed(client, payload) or {**payload, "updates": []}
+        self._enqueue(client, Frame(payload))
 
-    def connection_count(self) -> int:
-        return len(self._connections)
+    def resume(
+        self, websocket: WebSocket, last_seq: int, frames: list[dict[str, Any]]
+    ) -> None:
+        client = self._clients.get(websocket)
+        if client is None:
+            return
+        client.last_seq = last_seq
+        if frames:
+            merged = merge_frames(frames)
+            merged["epoch"] = live_state.epoch
+            self.send(websocket, merged)
 
+    def broadcast(self, payload: dict[str, Any]) -> None:
+        """Queue a frame for every interested client; never waits on a socket."""
+        # Shared by all unfiltered clients, so it is encoded once for all of them
+        frame = Frame(payload)
+        for client in list(self._clients.values()):
+            if client.view is None:
+                self._enqueue(client, frame)
 
-manager = LiveConnectionManager()
+        # Subscribers that see identical updates share one encoded frame too
+        shared: dict[Any, Frame] = {}
+        for websocket in self._subscribers.candidates(payload["updates"]):
+            client = self._clients.get(websocket)
+            if client is None or client.view is None:
+                continue
+            routed = self._routed(client, payload)
+            if routed is None:
+                continue
+            key = (
+                routed.get("from_seq"),
+                tuple(
+                    (
+                        u["type"],
+                        u["op"],
+                        tuple(id(e) for e in u.get("data", u.get("upserts", ()))),
+                        tuple(u.get("deletes", ())),
+                    )
+                    for u in routed["updates"]
+                ),
+            )
+            if key not in shared:
+                shared[key] = Frame(routed)
+            self._enqueue(client, shared[key])
 
+    def _drop_slow_client(self, client: LiveClient) -> None:
+        logger.warning("Live WS client too slow, disconnecting: %s", client.stats())
+        self._clients.pop(client.websocket, None)
+        self._forget_view(client)
+        client.stop()
+        task = asyncio.create_task(self._close(client.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
-async def broadcast_update(entity_type: str, data: Any) -> None:
-    payload = {"type": entity_type, "data": jsonable_encoder(data)}
-    await manager.broadcast(payload)
+    @staticmethod
+    async def _close(websocket: WebSocket) -> None:
+        try:
+            # 1013: try again later
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def connection_count(self) -> int:
+        return len(self._clients)
+
+    def client_stats(self) -> list[dict[str, Any]]:
+        return [client.stats() for client in self._clients.values()]
+
+
+manager = LiveConnectionManager()
+broadcast_scheduler = BroadcastScheduler()
+live_bus.set_handler(_apply_bus_message)
@@ -0,0 +1,155 @@
+"""Time-parameterized ambulance motion along a stored route.
+
+A leg is stored once, when it starts: the encoded route, the departure time
+and, for every route vertex, the distance from the start (route_cumulative_m)
+and the planned seconds after departure to reach it (route_times_s, the
+speed profile). Position, path cursor and remaining ETA at any instant are
+interpolated from those arrays, so nothing is written while the unit moves.
+
+Planned times assume a constant average speed matching the routed ETA; any
+non-decreasing route_times_s works with the same interpolation.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import polyline
+
+from schemas import Point
+from utils.geo import haversine_km
+from utils.path_codec import PATH_SIMPLIFY_TOLERANCE_M, encode_path
+
+# Used when a leg has no routed ETA (matches choose_ambulance.estimate_eta_seconds)
+DEFAULT_SPEED_KMH = 60.0
+
+
+@lru_cache(maxsize=512)
+def _decoded_coords(encoded: str) -> np.ndarray:
+    coords = np.array(polyline.decode(encoded), dtype=float).reshape(-1, 2)
+    coords.setflags(write=False)
+    return coords
+
+
+def cumulative_distances_m(coords: np.ndarray) -> np.ndarray:
+    """Prefix sums of segment lengths: meters from the first point to each point."""
+    if len(coords) == 0:
+        return np.empty(0)
+    steps = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    return np.concatenate(([0.0], np.cumsum(steps) * 1000))
+
+
+def plan_route(
+    path: Optional[Sequence[Point]],
+    duration_s: Optional[float],
+    departed_at: datetime,
+    tolerance_m: float = PATH_SIMPLIFY_TOLERANCE_M,
+) -> dict[str, Any]:
+    """Ambulance fields ($set-ready) for a leg along path taking duration_s."""
+    encoded = encode_path(path, tolerance_m)
+    if encoded is None:
+        return {
+            "path_encoded": None,
+            "path_index": 0,
+            "departed_at": None,
+            "route_cumulative_m": None,
+            "route_times_s": None,
+        }
+    # Planned on the decoded points, exactly as readers will see them
+    cumulative = cumulative_distances_m(_decoded_coords(encoded))
+    total_m = float(cumulative[-1])
+    if duration_s is None:
+        duration_s = total_m / 1000 / DEFAULT_SPEED_KMH * 3600
+    if total_m > 0:
+        times = cumulative / total_m * max(float(duration_s), 0.0)
+    else:
+        times = np.zeros_like(cumulative)
+    return {
+        "path_encoded": encoded,
+        "path_index": 0,
+        "departed_at": departed_at,
+        "route_cumulative_m": np.round(cumulative, 1).tolist(),
+        "route_times_s": np.round(times, 2).tolist(),
+    }
+
+
+@dataclass(frozen=True)
+class MotionState:
+    lat: float
+    lng: float
+    # Route vertices already reached; the remaining route is path[path_index:]
+    path_index: int
+    eta_seconds: int
+    arrived: bool
+
+
+class Motion:
+    """Where a unit is along its current leg at any instant."""
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        cumulative_m: Sequence[float],
+        times_s: Sequence[float],
+        departed_at: datetime,
+    ) -> None:
+        self.coords = coords
+        self.cumulative_m = np.asarray(cumulative_m, dtype=float)
+        self.times_s = np.asarray(times_s, dtype=float)
+        self.departed_at = departed_at
+
+    @classmethod
+    def of(cls, ambulance: Any) -> Optional["Motion"]:
+        """The ambulance's planned motion, or None if it has no timed route."""
+        return cls.from_fields(
+            ambulance.path_encoded,
+            ambulance.route_cumulative_m,
+            ambulance.route_times_s,
+            ambulance.departed_at,
+        )
+
+    @classmethod
+    def from_fields(
+        cls,
+        path_encoded: Optional[str],
+        cumulative_m: Optional[Sequence[float]],
+        times_s: Optional[Sequence[float]],
+        departed_at: Optional[datetime],
+    ) -> Optional["Motion"]:
+        if not path_encoded or departed_at is None or not cumulative_m or not times_s:
+            return None
+        coords = _decoded_coords(path_encoded)
+        if not len(coords) == len(cumulative_m) == len(times_s):
+            return None
+        return cls(coords, cumulative_m, times_s, departed_at)
+
+    @property
+    def duration_s(self) -> float:
+        return float(self.times_s[-1])
+
+    def state(self, at: Optional[datetime] = None) -> MotionState:
+        elapsed = _timestamp(at or datetime.utcnow()) - _timestamp(self.departed_at)
+        elapsed = min(max(elapsed, 0.0), self.duration_s)
+        # Time -> distance along the route -> position
+        distance = np.interp(elapsed, self.times_s, self.cumulative_m)
+        lat = float(np.interp(distance, self.cumulative_m, self.coords[:, 0]))
+        lng = float(np.interp(distance, self.cumulative_m, self.coords[:, 1]))
+        return MotionState(
+            lat=lat,
+            lng=lng,
+            path_index=int(np.searchsorted(self.times_s, elapsed, side="right")),
+            eta_seconds=int(round(self.duration_s - elapsed)),
+            arrived=elapsed >= self.duration_s,
+        )
+
+
+def _timestamp(value: datetime) -> float:
+    # Stored datetimes are naive UTC (datetime.utcnow())
+    if value.tzinfo is None:
+        return (value - _EPOCH).total_seconds()
+    return value.timestamp()
+
+
+_EPOCH = datetime(1970, 1, 1)
@@ -0,0 +1,83 @@
+"""Path simplification and compact storage for ambulance routes.
+
+Paths are stored as Google encoded polylines (precision 5, ~1 m) and decoded
+only where the points are actually needed.
+"""
+
+import os
+from typing import Sequence
+
+import numpy as np
+import polyline
+
+from schemas import Point
+from utils.geo import KM_PER_DEGREE
+
+# Max distance (meters) a dropped vertex may lie from the simplified line
+PATH_SIMPLIFY_TOLERANCE_M = float(os.getenv("PATH_SIMPLIFY_TOLERANCE_M", "5"))
+
+LatLngs = Sequence[Point] | Sequence[tuple[float, float]]
+
+
+def _as_array(points: LatLngs) -> np.ndarray:
+    if points and isinstance(points[0], Point):
+        return np.array([(p.lat, p.lng) for p in points], dtype=float)
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+
+def simplify_path(
+    points: LatLngs, tolerance_m: float = PATH_SIMPLIFY_TOLERANCE_M
+) -> np.ndarray:
+    """Douglas-Peucker simplification; returns an (n, 2) lat/lng array.
+
+    Distances use a local equirectangular projection, which is accurate to
+    well under a meter at city scale. Endpoints are always kept.
+    """
+    coords = _as_array(points)
+    if len(coords) < 3 or tolerance_m <= 0:
+        return coords
+
+    lat0 = np.radians(coords[:, 0].mean())
+    xy = np.column_stack(
+        (coords[:, 1] * np.cos(lat0), coords[:, 0])
+    ) * (KM_PER_DEGREE * 1000)
+
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        segment = b - a
+        inner = xy[start + 1 : end]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(*(inner - a).T)
+        else:
+            cross = segment[0] * (inner[:, 1] - a[1]) - segment[1] * (inner[:, 0] - a[0])
+            distances = np.abs(cross) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance_m:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return coords[keep]
+
+
+def encode_path(
+    points: LatLngs | None, tolerance_m: float = PATH_SIMPLIFY_TOLERANCE_M
+) -> str | None:
+    """Simplify and encode a path; None for an empty path."""
+    if points is None or len(points) == 0:
+        return None
+    coords = simplify_path(points, tolerance_m)
+    return polyline.encode([tuple(pt) for pt in coords.tolist()])
+
+
+def decode_path(encoded: str | None) -> list[Point]:
+    if not encoded:
+        return []
+    return [Point(lat=lat, lng=lng) for lat, lng in polyline.decode(encoded)]
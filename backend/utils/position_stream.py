@@ -0,0 +1,312 @@
+"""Compact binary ambulance positions for /ws/live/positions.
+
+Runs alongside the JSON channel and is fed from the same broadcast flushes.
+Ambulance ids are sent once as text frames mapping them to small indexes:
+
+    {"op": "ids", "start": 12, "ids": ["65a...", ...]}    # indexes 12, 13, ...
+
+Positions then go out as little-endian binary frames, one per tick:
+
+    header   u8 version (1), u8 kind (0 delta, 1 full), u32 seq, u32 count
+    record   u32 index, i32 lat * 1e7, i32 lng * 1e7, u8 status, u16 eta_s
+             (15 bytes; status 255 = removed, eta 65535 = none)
+
+Status codes follow the order of models.AmbulanceStatus. A client that falls
+behind has its backlog dropped and receives the next tick as a full frame.
+Units on a timed route (utils/motion.py) are interpolated every tick until
+they arrive, since their documents only change at the ends of a leg.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+from collections import deque
+from datetime import datetime
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+from fastapi import WebSocket
+
+from models import Ambulance, AmbulanceStatus
+from utils.json_codec import dumps
+from utils.motion import Motion
+
+logger = logging.getLogger(__name__)
+
+LIVE_POSITION_TICK_MS = int(os.getenv("LIVE_POSITION_TICK_MS", "100"))
+LIVE_POSITION_QUEUE_SIZE = int(os.getenv("LIVE_POSITION_QUEUE_SIZE", "16"))
+
+FRAME_VERSION = 1
+KIND_DELTA = 0
+KIND_FULL = 1
+STATUS_REMOVED = 255
+ETA_NONE = 65535
+COORD_SCALE = 1e7
+
+HEADER = struct.Struct("<BBII")
+RECORD_DTYPE = np.dtype(
+    [
+        ("index", "<u4"),
+        ("lat", "<i4"),
+        ("lng", "<i4"),
+        ("status", "u1"),
+        ("eta", "<u2"),
+    ]
+)
+
+STATUS_CODES = {status.value: code for code, status in enumerate(AmbulanceStatus)}
+STATUS_UNKNOWN = 254
+
+Message = Union[str, bytes]
+
+
+def encode_positions(seq: int, kind: int, records: np.ndarray) -> bytes:
+    return HEADER.pack(FRAME_VERSION, kind, seq, len(records)) + records.tobytes()
+
+
+class PositionClient:
+    def __init__(self, websocket: WebSocket, max_queue: int) -> None:
+        self.websocket = websocket
+        self.max_queue = max(max_queue, 1)
+        self.needs_full = True
+        self._queue: deque[Message] = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.backlogs_dropped = 0
+
+    def start(self, on_error) -> None:
+        self._writer = asyncio.create_task(self._write_loop(on_error))
+
+    def stop(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+
+    def enqueue(self, message: Message) -> None:
+        if isinstance(message, bytes) and len(self._queue) >= self.max_queue:
+            # Too slow: drop pending positions (id frames must stay) and
+            # catch up with a full frame on the next tick
+            self._queue = deque(m for m in self._queue if isinstance(m, str))
+            self.needs_full = True
+            self.backlogs_dropped += 1
+            return
+        self._queue.append(message)
+        self._ready.set()
+
+    async def _write_loop(self, on_error) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    message = self._queue.popleft()
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+                    self.frames_sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await on_error(self.websocket)
+
+
+class PositionStream:
+    """Batches ambulance position changes and fans them out once per tick."""
+
+    def __init__(
+        self,
+        tick_ms: int = LIVE_POSITION_TICK_MS,
+        max_queue: int = LIVE_POSITION_QUEUE_SIZE,
+    ) -> None:
+        self.tick_s = tick_ms / 1000
+        self.max_queue = max_queue
+        self.seq = 0
+        self._ids: list[str] = []
+        self._index: dict[str, int] = {}
+        self._announced = 0
+        # Latest record per index, for full frames
+        self._latest: dict[int, tuple[int, int, int, int]] = {}
+        self._dirty: set[int] = set()
+        # Units driving a timed route, by index
+        self._moving: dict[int, Motion] = {}
+        self._clients: dict[WebSocket, PositionClient] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._loaded = False
+        self.bytes_sent = 0
+
+    def _index_of(self, entity_id: str) -> int:
+        index = self._index.get(entity_id)
+        if index is None:
+            index = self._index[entity_id] = len(self._ids)
+            self._ids.append(entity_id)
+        return index
+
+    def update(self, ambulances: Iterable[dict[str, Any]]) -> None:
+        """Record encoded ambulance entities (as sent on the JSON channel)."""
+        for ambulance in ambulances:
+            index = self._index_of(str(ambulance["id"]))
+            status = ambulance.get("status")
+            status = getattr(status, "value", status)
+            self._set(
+                index,
+                ambulance["lat"],
+                ambulance["lng"],
+                STATUS_CODES.get(status, STATUS_UNKNOWN),
+                ambulance.get("eta_seconds"),
+            )
+            motion = Motion.from_fields(
+                ambulance.get("path_encoded"),
+                ambulance.get("route_cumulative_m"),
+                ambulance.get("route_times_s"),
+                ambulance.get("departed_at"),
+            )
+            if motion is not None and not motion.state().arrived:
+                self._moving[index] = motion
+            else:
+                self._moving.pop(index, None)
+        self._schedule()
+
+    def _set(
+        self, index: int, lat: float, lng: float, status: int, eta: Optional[int]
+    ) -> None:
+        self._latest[index] = (
+            round(lat * COORD_SCALE),
+            round(lng * COORD_SCALE),
+            status,
+            ETA_NONE if eta is None else min(int(eta), ETA_NONE - 1),
+        )
+        self._dirty.add(index)
+
+    def _advance_moving(self) -> None:
+        now = datetime.utcnow()
+        for index, motion in list(self._moving.items()):
+            state = motion.state(now)
+            self._set(index, state.lat, state.lng, self._latest[index][2], state.eta_seconds)
+            if state.arrived:
+                del self._moving[index]
+
+    def remove(self, entity_ids: Iterable[str]) -> None:
+        for entity_id in entity_ids:
+            index = self._index.get(str(entity_id))
+            if index is not None and index in self._latest:
+                lat, lng, _, _ = self._latest[index]
+                self._latest[index] = (lat, lng, STATUS_REMOVED, ETA_NONE)
+                self._dirty.add(index)
+                self._moving.pop(index, None)
+        self._schedule()
+
+    def _schedule(self, force: bool = False) -> None:
+        if not self._clients or not (self._dirty or self._moving or force):
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_tick())
+
+    async def _flush_after_tick(self) -> None:
+        await asyncio.sleep(self.tick_s)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Position stream flush failed")
+        # Keep ticking while units are on the road
+        self._flush_task = None
+        self._schedule()
+
+    def _records(self, indexes: Iterable[int]) -> np.ndarray:
+        indexes = sorted(indexes)
+        records = np.empty(len(indexes), dtype=RECORD_DTYPE)
+        if indexes:
+            records["index"] = indexes
+            values = np.array([self._latest[i] for i in indexes], dtype=np.int64)
+            records["lat"] = values[:, 0]
+            records["lng"] = values[:, 1]
+            records["status"] = values[:, 2]
+            records["eta"] = values[:, 3]
+        return records
+
+    def _ids_message(self, start: int) -> str:
+        return dumps({"op": "ids", "start": start, "ids": self._ids[start:]}).decode()
+
+    def flush(self) -> None:
+        if self._clients:
+            self._advance_moving()
+        dirty, self._dirty = self._dirty, set()
+        if not self._clients:
+            return
+        self.seq += 1
+
+        new_ids = None
+        if self._announced < len(self._ids):
+            new_ids = self._ids_message(self._announced)
+            self._announced = len(self._ids)
+
+        # Encoded once per tick and shared by every client
+        delta = None
+        if dirty:
+            delta = encode_positions(self.seq, KIND_DELTA, self._records(dirty))
+        all_ids = full = None
+        for client in list(self._clients.values()):
+            if client.needs_full:
+                if full is None:
+                    all_ids = self._ids_message(0)
+                    full = encode_positions(self.seq, KIND_FULL, self._records(self._latest))
+                client.needs_full = False
+                client.enqueue(all_ids)
+                client.enqueue(full)
+                self.bytes_sent += len(full)
+                continue
+            if new_ids is not None:
+                client.enqueue(new_ids)
+            if delta is not None:
+                client.enqueue(delta)
+                self.bytes_sent += len(delta)
+
+    async def load(self) -> None:
+        """Start from the stored fleet so new clients see parked units too."""
+        ambulances = await Ambulance.find_all().to_list()
+        self.update(
+            {
+                "id": a.id,
+                "lat": a.lat,
+                "lng": a.lng,
+                "status": a.status,
+                "eta_seconds": a.eta_seconds,
+                "path_encoded": a.path_encoded,
+                "route_cumulative_m": a.route_cumulative_m,
+                "route_times_s": a.route_times_s,
+                "departed_at": a.departed_at,
+            }
+            for a in ambulances
+        )
+        self._loaded = True
+
+    async def connect(self, websocket: WebSocket) -> None:
+        await websocket.accept()
+        client = PositionClient(websocket, self.max_queue)
+        self._clients[websocket] = client
+        client.start(self.disconnect)
+        if not self._loaded:
+            await self.load()
+        # The ids and a full frame go out with the next tick
+        self._schedule(force=True)
+        logger.info("Position stream connected (%s clients)", len(self._clients))
+
+    async def disconnect(self, websocket: WebSocket) -> None:
+        client = self._clients.pop(websocket, None)
+        if client is not None:
+            client.stop()
+            logger.info("Position stream disconnected (%s clients)", len(self._clients))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connections": len(self._clients),
+            "vehicles": len(self._latest),
+            "moving": len(self._moving),
+            "seq": self.seq,
+            "bytes_sent": self.bytes_sent,
+            "backlogs_dropped": sum(c.backlogs_dropped for c in self._clients.values()),
+        }
+
+
+position_stream = PositionStream()
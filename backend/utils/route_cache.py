@@ -0,0 +1,161 @@
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ~110 m at the default; origins/destinations inside one cell share a route
+ROUTE_CACHE_GRID_DEG = float(os.getenv("ROUTE_CACHE_GRID_DEG", "0.001"))
+# Traffic-aware ETAs go stale; keep entries about as long as traffic does
+ROUTE_CACHE_TTL_S = float(os.getenv("ROUTE_CACHE_TTL_S", "300"))
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "5000"))
+ROUTE_CACHE_PATH = os.getenv("ROUTE_CACHE_PATH") or None
+
+RouteKey = tuple[int, int, int, int]
+RouteValue = tuple[int, Optional[list[tuple[float, float]]]]
+
+
+class RouteCache:
+    """LRU cache of (eta_seconds, path) keyed by grid-quantized origin/destination."""
+
+    def __init__(
+        self,
+        grid_deg: float = ROUTE_CACHE_GRID_DEG,
+        ttl_s: float = ROUTE_CACHE_TTL_S,
+        max_entries: int = ROUTE_CACHE_MAX_ENTRIES,
+        path: Optional[str] = ROUTE_CACHE_PATH,
+    ) -> None:
+        self.grid_deg = grid_deg
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.path = path
+        # key -> (stored_at, value); wall-clock so entries survive a restart
+        self._entries: OrderedDict[RouteKey, tuple[float, RouteValue]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(
+        self, origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float
+    ) -> RouteKey:
+        q = self.grid_deg
+        return (
+            math.floor(origin_lat / q),
+            math.floor(origin_lng / q),
+            math.floor(dest_lat / q),
+            math.floor(dest_lng / q),
+        )
+
+    def get(
+        self,
+        origin_lat: float,
+        origin_lng: float,
+        dest_lat: float,
+        dest_lng: float,
+        count: bool = True,
+    ) -> Optional[RouteValue]:
+        """The fresh cached route, if any.
+
+        With count=False the lookup is left out of the hit/miss counters; the
+        caller reports its outcome with count_lookup().
+        """
+        key = self.key(origin_lat, origin_lng, dest_lat, dest_lng)
+        entry = self._entries.get(key)
+        value = None
+        if entry is not None:
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl_s:
+                del self._entries[key]
+                value = None
+            else:
+                self._entries.move_to_end(key)
+        if count:
+            self.count_lookup(value is not None)
+        return value
+
+    def count_lookup(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(
+        self,
+        origin_lat: float,
+        origin_lng: float,
+        dest_lat: float,
+        dest_lng: float,
+        eta_seconds: int,
+        path: Optional[list[tuple[float, float]]],
+    ) -> None:
+        key = self.key(origin_lat, origin_lng, dest_lat, dest_lng)
+        self._entries[key] = (time.time(), (eta_seconds, path))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self) -> None:
+        """Restore unexpired entries from the persistence file, if configured."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Route cache not loaded from %s: %s", self.path, e)
+            return
+        if data.get("grid_deg") != self.grid_deg:
+            logger.info("Route cache grid changed, discarding %s", self.path)
+            return
+
+        now = time.time()
+        for key, stored_at, eta, path in data.get("entries", []):
+            if now - stored_at > self.ttl_s:
+                continue
+            points = [tuple(pt) for pt in path] if path else None
+            self._entries[tuple(key)] = (stored_at, (eta, points))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.info("Route cache loaded %s entries", len(self._entries))
+
+    def save(self) -> None:
+        """Write unexpired entries to the persistence file, if configured."""
+        if not self.path:
+            return
+        now = time.time()
+        entries = [
+            [list(key), stored_at, eta, path]
+            for key, (stored_at, (eta, path)) in self._entries.items()
+            if now - stored_at <= self.ttl_s
+        ]
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"grid_deg": self.grid_deg, "entries": entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Route cache not saved to %s: %s", self.path, e)
+
+
+route_cache = RouteCache()
@@ -0,0 +1,144 @@
+"""Shared clock for simulated ambulance movement.
+
+Moving ambulances follow timed routes (utils/motion.py): their position is
+interpolated on demand, so nothing is written while they drive. One tick
+loop watches every active leg and persists the legs that arrived in that
+tick with a single bulk_write and one broadcast.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+
+from models import Ambulance
+from schemas import GeoPoint
+from utils.live_ws import broadcast_documents
+from utils.motion import Motion
+from utils.state_cache import state_cache
+
+logger = logging.getLogger(__name__)
+
+SIMULATION_TICK_MS = int(os.getenv("SIMULATION_TICK_MS", "500"))
+
+
+class LegSuperseded(Exception):
+    """A newer simulation of the same ambulance took over its leg."""
+
+
+class _Leg:
+    __slots__ = ("ambulance", "motion", "done")
+
+    def __init__(self, ambulance: Ambulance, motion: Motion, done: asyncio.Future) -> None:
+        self.ambulance = ambulance
+        self.motion = motion
+        self.done = done
+
+
+class SimulationEngine:
+    def __init__(self, tick_ms: int = SIMULATION_TICK_MS) -> None:
+        self.tick_ms = max(tick_ms, 1)
+        self.ticks = 0
+        self._legs: dict[PydanticObjectId, _Leg] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._legs)
+
+    async def follow(self, ambulance: Ambulance) -> None:
+        """Wait until the ambulance reaches the end of its timed route.
+
+        Raises LegSuperseded if another follow() of the same ambulance starts
+        first.
+        """
+        motion = ambulance.motion()
+        if motion is None:
+            return
+        leg = _Leg(ambulance, motion, asyncio.get_running_loop().create_future())
+        previous = self._legs.get(ambulance.id)
+        if previous is not None and not previous.done.done():
+            previous.done.set_exception(LegSuperseded(str(ambulance.id)))
+        self._legs[ambulance.id] = leg
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            await leg.done
+        finally:
+            if self._legs.get(ambulance.id) is leg:
+                del self._legs[ambulance.id]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._legs:
+            started = loop.time()
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Simulation tick failed")
+            elapsed = loop.time() - started
+            await asyncio.sleep(max(self.tick_ms / 1000 - elapsed, 0))
+
+    async def tick(self) -> None:
+        """Advance every leg in memory and persist the ones that arrived."""
+        self.ticks += 1
+        now = datetime.utcnow()
+        arrived: list[_Leg] = []
+        for leg in list(self._legs.values()):
+            if leg.done.done():
+                continue
+            state = leg.motion.state(now)
+            ambulance = leg.ambulance
+            ambulance.lat = state.lat
+            ambulance.lng = state.lng
+            ambulance.path_index = state.path_index
+            ambulance.eta_seconds = state.eta_seconds
+            if state.arrived:
+                arrived.append(leg)
+        if not arrived:
+            return
+
+        writes = []
+        for leg in arrived:
+            ambulance = leg.ambulance
+            ambulance.updated_at = now
+            ambulance.location = GeoPoint.of(ambulance.lat, ambulance.lng)
+            writes.append(
+                UpdateOne(
+                    {"_id": ambulance.id},
+                    {
+                        "$set": {
+                            "lat": ambulance.lat,
+                            "lng": ambulance.lng,
+                            "location": ambulance.location.model_dump(mode="json"),
+                            "path_index": ambulance.path_index,
+                            "eta_seconds": ambulance.eta_seconds,
+                            "updated_at": now,
+                        }
+                    },
+                )
+            )
+        try:
+            await Ambulance.get_pymongo_collection().bulk_write(writes, ordered=False)
+        finally:
+            # Bulk writes bypass the document hooks
+            for leg in arrived:
+                state_cache.apply(leg.ambulance)
+            broadcast_documents("ambulances", [leg.ambulance for leg in arrived])
+            for leg in arrived:
+                if not leg.done.done():
+                    leg.done.set_result(None)
+
+    async def close(self) -> None:
+        for leg in self._legs.values():
+            leg.done.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+simulation_engine = SimulationEngine()
@@ -0,0 +1,183 @@
+import logging
+import math
+import os
+from typing import Any, Hashable, Iterator, Optional
+
+from beanie import PydanticObjectId
+
+from utils.geo import KM_PER_DEGREE, nearest_k
+
+logger = logging.getLogger(__name__)
+
+AMBULANCE_INDEX_CELL_DEG = float(os.getenv("AMBULANCE_INDEX_CELL_DEG", "0.01"))
+
+Cell = tuple[int, int]
+
+
+class GridIndex:
+    """Uniform lat/lng bucket grid answering k-nearest queries by ring search."""
+
+    def __init__(self, cell_deg: float = AMBULANCE_INDEX_CELL_DEG) -> None:
+        self.cell_deg = cell_deg
+        self._cells: dict[Cell, dict[Hashable, tuple[float, float]]] = {}
+        self._positions: dict[Hashable, tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._positions
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def insert(self, key: Hashable, lat: float, lng: float) -> None:
+        self.remove(key)
+        self._positions[key] = (lat, lng)
+        self._cells.setdefault(self._cell(lat, lng), {})[key] = (lat, lng)
+
+    def remove(self, key: Hashable) -> None:
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        cell = self._cell(*position)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._positions.clear()
+
+    def _ring(self, center: Cell, radius: int) -> Iterator[Cell]:
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for di in range(-radius, radius + 1):
+            if abs(di) == radius:
+                for dj in range(-radius, radius + 1):
+                    yield (ci + di, cj + dj)
+            else:
+                yield (ci + di, cj - radius)
+                yield (ci + di, cj + radius)
+
+    def _min_ring_gap_km(self, lat: float, radius: int) -> float:
+        # Any point outside rings 0..radius is at least `radius` whole cells
+        # away along one axis; longitude cells are the narrower ones.
+        extent = min(89.9, abs(lat) + (radius + 1) * self.cell_deg)
+        cell_km = self.cell_deg * KM_PER_DEGREE * math.cos(math.radians(extent))
+        return radius * cell_km
+
+    def nearest(
+        self, lat: float, lng: float, k: int = 1
+    ) -> list[tuple[Hashable, float]]:
+        """Return up to k (key, distance_km) pairs ordered by distance."""
+        if k <= 0 or not self._positions:
+            return []
+
+        center = self._cell(lat, lng)
+        keys: list[Hashable] = []
+        coords: list[tuple[float, float]] = []
+        radius = 0
+
+        while len(keys) < len(self._positions):
+            ring_size = 1 if radius == 0 else 8 * radius
+            if ring_size > len(self._cells):
+                # Sparse grid: cheaper to sweep the remaining buckets directly.
+                for cell, bucket in self._cells.items():
+                    if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) < radius:
+                        continue
+                    keys.extend(bucket.keys())
+                    coords.extend(bucket.values())
+                break
+
+            for cell in self._ring(center, radius):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    keys.extend(bucket.keys())
+                    coords.extend(bucket.values())
+
+            if len(keys) >= k:
+                lats, lngs = zip(*coords)
+                _, distances = nearest_k(lat, lng, lats, lngs, k)
+                if distances[-1] <= self._min_ring_gap_km(lat, radius):
+                    break
+            radius += 1
+
+        if not keys:
+            return []
+        lats, lngs = zip(*coords)
+        order, distances = nearest_k(lat, lng, lats, lngs, k)
+        return [(keys[i], float(d)) for i, d in zip(order, distances)]
+
+
+class AmbulanceIndex:
+    """In-memory location index of idle ambulances, kept in sync on every save."""
+
+    def __init__(self, cell_deg: float = AMBULANCE_INDEX_CELL_DEG) -> None:
+        self._idle = GridIndex(cell_deg)
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    def update(self, ambulance: Any) -> None:
+        """Reflect an ambulance document's current position and status."""
+        if ambulance is None or ambulance.id is None:
+            return
+        from models import AmbulanceStatus
+
+        if ambulance.status == AmbulanceStatus.IDLE:
+            self._idle.insert(ambulance.id, ambulance.lat, ambulance.lng)
+        else:
+            self._idle.remove(ambulance.id)
+
+    def discard(self, ambulance_id: PydanticObjectId) -> None:
+        self._idle.remove(ambulance_id)
+
+    def nearest_idle(
+        self, lat: float, lng: float, k: int = 1
+    ) -> list[tuple[PydanticObjectId, float]]:
+        """Return up to k (ambulance_id, distance_km) pairs of idle ambulances."""
+        return self._idle.nearest(lat, lng, k)
+
+    async def load(self) -> None:
+        """Rebuild the index from MongoDB."""
+        from models import Ambulance
+
+        ambulances = await Ambulance.find_all().to_list()
+        self._idle.clear()
+        for ambulance in ambulances:
+            self.update(ambulance)
+        logger.info(
+            "Ambulance index loaded (%s idle of %s)", len(self._idle), len(ambulances)
+        )
+
+
+async def geo_near(
+    model: Any, lat: float, lng: float, k: int, query: Optional[dict[str, Any]] = None
+) -> list[tuple[Any, float]]:
+    """The k documents of a GeoDocument model nearest (lat, lng), with their
+    distance in km, using $geoNear on the 2dsphere-indexed location."""
+    pipeline = [
+        {
+            "$geoNear": {
+                "near": {"type": "Point", "coordinates": [lng, lat]},
+                "key": "location",
+                "distanceField": "_distance_m",
+                "spherical": True,
+                "query": query or {},
+            }
+        },
+        {"$limit": k},
+    ]
+    found = []
+    for doc in await model.aggregate(pipeline).to_list():
+        distance_km = doc.pop("_distance_m") / 1000
+        found.append((model.model_validate(doc), distance_km))
+    return found
+
+
+ambulance_index = AmbulanceIndex()
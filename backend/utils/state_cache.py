@@ -0,0 +1,175 @@
+"""Write-through in-memory view of cameras, ambulances, hospitals and open events.
+
+Loaded once at startup and then kept current by:
+  - MongoDB change streams, when the deployment supports them (replica set);
+  - otherwise, local writes (document event hooks in models.py) plus the
+    documents other workers publish on the live bus.
+
+Reads fall back to MongoDB until the cache is loaded. Every applied
+ambulance also updates the idle-ambulance index (utils/spatial_index.py),
+so dispatch on each worker sees units freed or claimed on the others.
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+from typing import Any, Optional
+
+from beanie import Document, PydanticObjectId
+
+logger = logging.getLogger(__name__)
+
+STATE_CACHE_CHANGE_STREAMS = os.getenv(
+    "STATE_CACHE_CHANGE_STREAMS", "true"
+).lower() in ("1", "true", "yes")
+
+CACHED_COLLECTIONS = ("cameras", "ambulances", "hospitals", "events")
+
+
+def _collection(model: type[Document]) -> str:
+    return model.Settings.name
+
+
+class StateCache:
+    def __init__(self) -> None:
+        self._documents: dict[str, dict[PydanticObjectId, Document]] = {
+            name: {} for name in CACHED_COLLECTIONS
+        }
+        self._models: dict[str, type[Document]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self.ready = False
+        self.source = "mongodb"
+
+    @staticmethod
+    def _keep(document: Document) -> bool:
+        # Resolved events are history; only live ones are kept in memory
+        from models import Event, EventStatus
+
+        return not isinstance(document, Event) or document.status != EventStatus.RESOLVED
+
+    def apply(self, document: Document) -> None:
+        """Record a written or freshly read document."""
+        from models import Ambulance
+        from utils.spatial_index import ambulance_index
+
+        documents = self._documents.get(_collection(type(document)))
+        if documents is None or document.id is None:
+            return
+        if self._keep(document):
+            documents[document.id] = document
+        else:
+            documents.pop(document.id, None)
+        if isinstance(document, Ambulance):
+            ambulance_index.update(document)
+
+    def discard(self, model: type[Document], document_id: PydanticObjectId) -> None:
+        from models import Ambulance
+        from utils.spatial_index import ambulance_index
+
+        documents = self._documents.get(_collection(model))
+        if documents is not None:
+            documents.pop(document_id, None)
+        if issubclass(model, Ambulance):
+            ambulance_index.discard(document_id)
+
+    def cached(self, model: type[Document]) -> Optional[list[Document]]:
+        """All cached documents of a model, or None when not loaded."""
+        if not self.ready:
+            return None
+        return list(self._documents[_collection(model)].values())
+
+    async def find_all(self, model: type[Document]) -> list[Document]:
+        cached = self.cached(model)
+        if cached is not None:
+            return cached
+        return await model.find_all().to_list()
+
+    async def load(self) -> None:
+        from models import Ambulance, Camera, Event, EventStatus, Hospital
+
+        self._models = {
+            _collection(model): model for model in (Camera, Ambulance, Hospital, Event)
+        }
+        for name, model in self._models.items():
+            if model is Event:
+                documents = await Event.find(Event.status != EventStatus.RESOLVED).to_list()
+            else:
+                documents = await model.find_all().to_list()
+            self._documents[name] = {doc.id: doc for doc in documents}
+        self.ready = True
+        self.source = "local writes"
+        logger.info(
+            "State cache loaded: %s",
+            {name: len(docs) for name, docs in self._documents.items()},
+        )
+        if STATE_CACHE_CHANGE_STREAMS:
+            await self._start_change_streams()
+
+    async def _open_stream(self, model: type[Document]):
+        stream = model.get_pymongo_collection().watch(full_document="updateLookup")
+        # Motor returns the stream directly, the async PyMongo API a coroutine
+        if inspect.isawaitable(stream):
+            stream = await stream
+        return stream
+
+    async def _start_change_streams(self) -> None:
+        streams = []
+        try:
+            for model in self._models.values():
+                streams.append((model, await self._open_stream(model)))
+        except Exception as e:
+            # Standalone servers have no change streams
+            logger.info("Change streams unavailable (%s); using local writes", e)
+            for _, stream in streams:
+                await _close_stream(stream)
+            return
+        self.source = "change streams"
+        self._tasks = [
+            asyncio.create_task(self._follow(model, stream)) for model, stream in streams
+        ]
+
+    async def _follow(self, model: type[Document], stream: Any) -> None:
+        try:
+            async for change in stream:
+                operation = change.get("operationType")
+                if operation in ("insert", "replace", "update"):
+                    full = change.get("fullDocument")
+                    if full is not None:
+                        self.apply(model.model_validate(full))
+                    else:
+                        # Deleted before the lookup ran
+                        self.discard(model, change["documentKey"]["_id"])
+                elif operation == "delete":
+                    self.discard(model, change["documentKey"]["_id"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(
+                "Change stream for %s stopped; using local writes", _collection(model)
+            )
+            self.source = "local writes"
+        finally:
+            await _close_stream(stream)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "source": self.source,
+            "counts": {name: len(docs) for name, docs in self._documents.items()},
+        }
+
+
+async def _close_stream(stream: Any) -> None:
+    result = stream.close()
+    if inspect.isawaitable(result):
+        await result
+
+
+state_cache = StateCache()
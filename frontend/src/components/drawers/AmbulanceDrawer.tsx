@@ -1,4 +1,6 @@
+import { useClock } from "../../hooks/useClock";
 import type { Ambulance } from "../../types";
+import { etaSecondsAt, motionAt } from "../paths/motion";
 
 type AmbulanceDrawerProps = {
   ambulance: Ambulance;
@@ -8,9 +10,12 @@ type AmbulanceDrawerProps = {
  * Drawer content for an ambulance unit.
  */
 export default function AmbulanceDrawer({ ambulance }: AmbulanceDrawerProps) {
-  const etaMinutes = ambulance.eta_seconds
-    ? Math.max(1, Math.round(ambulance.eta_seconds / 60))
+  const now = useClock();
+  const etaSeconds = etaSecondsAt(ambulance, now);
+  const etaMinutes = etaSeconds
+    ? Math.max(1, Math.round(etaSeconds / 60))
     : null;
+  const position = motionAt(ambulance, now)?.position ?? ambulance;
 
   return (
     <div className="space-y-4">
@@ -27,7 +32,7 @@ export default function AmbulanceDrawer({ ambulance }: AmbulanceDrawerProps) {
       <div className="rounded-2xl border border-white/10 bg-slate-900/60 p-4 text-xs text-slate-300">
         <p className="text-slate-400">Location</p>
         <p>
-          {ambulance.lat.toFixed(4)},{ambulance.lng.toFixed(4)}
+          {position.lat.toFixed(4)},{position.lng.toFixed(4)}
         </p>
       </div>
     </div>
@@ -1,4 +1,6 @@
+import { useClock } from "../../hooks/useClock";
 import type { Ambulance, Event } from "../../types";
+import { etaSecondsAt } from "../paths/motion";
 
 type EventDrawerProps = {
   event: Event;
@@ -12,9 +14,10 @@ export default function EventDrawer({ event, ambulances }: EventDrawerProps) {
   const assigned = ambulances.find(
     (ambulance) => String(ambulance.id) === String(event.ambulance_id),
   );
-  const etaMinutes = assigned
-    ? Math.max(1, Math.round(assigned.eta_seconds / 60))
-    : null;
+  const now = useClock();
+  const etaSeconds = assigned ? etaSecondsAt(assigned, now) : null;
+  const etaMinutes =
+    etaSeconds != null ? Math.max(1, Math.round(etaSeconds / 60)) : null;
 
   return (
     <div className="space-y-4">
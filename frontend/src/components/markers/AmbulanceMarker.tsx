@@ -1,6 +1,7 @@
 import { useEffect, useRef, useState } from "react";
 import { Marker } from "react-map-gl/maplibre";
 import type { Ambulance } from "../../types";
+import { hasMotion, motionAt } from "../paths/motion";
 
 type AmbulanceMarkerProps = {
   ambulance: Ambulance;
@@ -31,6 +32,24 @@ export default function AmbulanceMarker({
       cancelAnimationFrame(animationRef.current);
     }
 
+    if (hasMotion(ambulance)) {
+      // Drive the timed route locally until the unit arrives
+      const follow = () => {
+        const state = motionAt(ambulance);
+        if (!state) return;
+        setPosition(state.position);
+        if (!state.arrived) {
+          animationRef.current = requestAnimationFrame(follow);
+        }
+      };
+      animationRef.current = requestAnimationFrame(follow);
+      return () => {
+        if (animationRef.current) {
+          cancelAnimationFrame(animationRef.current);
+        }
+      };
+    }
+
     const start = { ...position };
     const target = { lat: ambulance.lat, lng: ambulance.lng };
     const duration = 700;
@@ -58,7 +77,12 @@ export default function AmbulanceMarker({
         cancelAnimationFrame(animationRef.current);
       }
     };
-  }, [ambulance.lat, ambulance.lng]);
+  }, [
+    ambulance.lat,
+    ambulance.lng,
+    ambulance.path_encoded,
+    ambulance.departed_at,
+  ]);
 
   return (
     <Marker
@@ -1,6 +1,9 @@
 import { useMemo } from "react";
 import { Layer, Source, type LayerProps } from "react-map-gl/maplibre";
 import type { Ambulance, Point } from "../../types";
+import { useClock } from "../../hooks/useClock";
+import { motionAt } from "./motion";
+import { remainingPath } from "./polyline";
 
 type AmbulancePathProps = {
   ambulance: Ambulance;
@@ -56,7 +59,14 @@ const colorFromId = (id: string) => {
 const mapPoint = (point: Point) => [point.lng, point.lat] as [number, number];
 
 export default function AmbulancePath({ ambulance }: AmbulancePathProps) {
-  const path = ambulance.path ?? [];
+  const now = useClock();
+  const motion = motionAt(ambulance, now);
+  const pathIndex = motion?.pathIndex ?? ambulance.path_index;
+  const head = motion?.position ?? ambulance;
+  const path = useMemo(
+    () => remainingPath(ambulance, pathIndex),
+    [ambulance.path_encoded, pathIndex],
+  );
   const hasPath = path.length > 0;
 
   const { core, glow } = useMemo(
@@ -65,9 +75,9 @@ export default function AmbulancePath({ ambulance }: AmbulancePathProps) {
   );
 
   const coordinates = useMemo(() => {
-    const line = [[ambulance.lng, ambulance.lat] as [number, number]];
+    const line = [[head.lng, head.lat] as [number, number]];
     return line.concat(path.map(mapPoint));
-  }, [ambulance.lat, ambulance.lng, path]);
+  }, [head.lat, head.lng, path]);
 
   const geojson = useMemo(
     () => ({
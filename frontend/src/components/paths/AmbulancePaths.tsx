@@ -1,6 +1,9 @@
 import { useMemo } from "react";
 import { Layer, Source, type LayerProps } from "react-map-gl/maplibre";
 import type { Ambulance, Point } from "../../types";
+import { useClock } from "../../hooks/useClock";
+import { motionAt } from "./motion";
+import { remainingPath } from "./polyline";
 
 type AmbulancePathsProps = {
   ambulances: Ambulance[];
@@ -68,14 +71,24 @@ const colorFromId = (id: string) => {
 const mapPoint = (point: Point) => [point.lng, point.lat] as [number, number];
 
 export default function AmbulancePaths({ ambulances }: AmbulancePathsProps) {
+  // Timed routes shorten between live updates
+  const now = useClock();
+
   const features = useMemo<LineFeature[]>(() => {
     return ambulances
-      .filter((ambulance) => ambulance.path && ambulance.path.length > 0)
       .map((ambulance) => {
-        const path = ambulance.path ?? [];
+        const motion = motionAt(ambulance, now);
+        return {
+          ambulance,
+          head: motion?.position ?? ambulance,
+          path: remainingPath(ambulance, motion?.pathIndex),
+        };
+      })
+      .filter(({ path }) => path.length > 0)
+      .map(({ ambulance, head, path }) => {
         const { core, glow } = colorFromId(String(ambulance.id));
         const coordinates = [
-          [ambulance.lng, ambulance.lat] as [number, number],
+          [head.lng, head.lat] as [number, number],
           ...path.map(mapPoint),
         ];
 
@@ -92,7 +105,7 @@ export default function AmbulancePaths({ ambulances }: AmbulancePathsProps) {
           },
         };
       });
-  }, [ambulances]);
+  }, [ambulances, now]);
 
   const geojson = useMemo(
     () => ({
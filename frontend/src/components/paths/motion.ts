@@ -0,0 +1,88 @@
+import type { Ambulance, Point } from "../../types";
+import { decodedPath } from "./polyline";
+
+// Mirrors backend/utils/motion.py: time -> distance along the route -> position
+
+export type MotionState = {
+  position: Point;
+  // Route points already reached; the rest of the route is path[pathIndex:]
+  pathIndex: number;
+  etaSeconds: number;
+  arrived: boolean;
+};
+
+const TIMEZONE = /(Z|[+-]\d\d:?\d\d)$/i;
+
+// The backend stores naive UTC datetimes
+const parseUtc = (value: string) =>
+  Date.parse(TIMEZONE.test(value) ? value : `${value}Z`);
+
+// Linear interpolation over non-decreasing xs, clamped at both ends
+const interpolate = (x: number, xs: number[], ys: number[]) => {
+  if (x <= xs[0]) return ys[0];
+  const last = xs.length - 1;
+  if (x >= xs[last]) return ys[last];
+  let low = 0;
+  let high = last;
+  while (high - low > 1) {
+    const mid = (low + high) >> 1;
+    if (xs[mid] <= x) low = mid;
+    else high = mid;
+  }
+  const span = xs[high] - xs[low];
+  const t = span > 0 ? (x - xs[low]) / span : 0;
+  return ys[low] + (ys[high] - ys[low]) * t;
+};
+
+export const hasMotion = (ambulance: Ambulance) =>
+  Boolean(
+    ambulance.path_encoded &&
+      ambulance.departed_at &&
+      ambulance.route_cumulative_m?.length &&
+      ambulance.route_times_s?.length,
+  );
+
+export const motionAt = (
+  ambulance: Ambulance,
+  nowMs: number = Date.now(),
+): MotionState | null => {
+  if (!hasMotion(ambulance)) return null;
+  const path = decodedPath(ambulance.path_encoded!);
+  const cumulative = ambulance.route_cumulative_m!;
+  const times = ambulance.route_times_s!;
+  if (path.length !== cumulative.length || path.length !== times.length) {
+    return null;
+  }
+
+  const duration = times[times.length - 1];
+  const elapsed = Math.min(
+    Math.max((nowMs - parseUtc(ambulance.departed_at!)) / 1000, 0),
+    duration,
+  );
+  const distance = interpolate(elapsed, times, cumulative);
+  const position = {
+    lat: interpolate(
+      distance,
+      cumulative,
+      path.map((point) => point.lat),
+    ),
+    lng: interpolate(
+      distance,
+      cumulative,
+      path.map((point) => point.lng),
+    ),
+  };
+  let pathIndex = 0;
+  while (pathIndex < times.length && times[pathIndex] <= elapsed) pathIndex += 1;
+
+  return {
+    position,
+    pathIndex,
+    etaSeconds: Math.round(duration - elapsed),
+    arrived: elapsed >= duration,
+  };
+};
+
+// Remaining ETA, from the timed route when there is one
+export const etaSecondsAt = (ambulance: Ambulance, nowMs: number = Date.now()) =>
+  motionAt(ambulance, nowMs)?.etaSeconds ?? ambulance.eta_seconds ?? null;
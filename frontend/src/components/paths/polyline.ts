@@ -0,0 +1,52 @@
+import type { Ambulance, Point } from "../../types";
+
+// Google encoded polyline, precision 5 (matches backend/utils/path_codec.py)
+export const decodePolyline = (encoded: string): Point[] => {
+  const points: Point[] = [];
+  let index = 0;
+  let lat = 0;
+  let lng = 0;
+
+  const nextValue = () => {
+    let result = 0;
+    let shift = 0;
+    let byte: number;
+    do {
+      byte = encoded.charCodeAt(index) - 63;
+      index += 1;
+      result |= (byte & 0x1f) << shift;
+      shift += 5;
+    } while (byte >= 0x20);
+    return result & 1 ? ~(result >> 1) : result >> 1;
+  };
+
+  while (index < encoded.length) {
+    lat += nextValue();
+    lng += nextValue();
+    points.push({ lat: lat / 1e5, lng: lng / 1e5 });
+  }
+  return points;
+};
+
+const decoded = new Map<string, Point[]>();
+
+export const decodedPath = (encoded: string): Point[] => {
+  let path = decoded.get(encoded);
+  if (!path) {
+    path = decodePolyline(encoded);
+    // Only current routes are worth keeping
+    if (decoded.size > 256) decoded.clear();
+    decoded.set(encoded, path);
+  }
+  return path;
+};
+
+// Points of the route the ambulance has not reached yet
+export const remainingPath = (
+  ambulance: Ambulance,
+  pathIndex = ambulance.path_index ?? 0,
+): Point[] => {
+  const encoded = ambulance.path_encoded;
+  if (!encoded) return [];
+  return decodedPath(encoded).slice(pathIndex);
+};
@@ -0,0 +1,16 @@
+import { useEffect, useState } from "react";
+
+/**
+ * Current time in ms, refreshed every intervalMs (for ETAs and routes that
+ * advance between live updates).
+ */
+export function useClock(intervalMs = 1000) {
+  const [now, setNow] = useState(() => Date.now());
+
+  useEffect(() => {
+    const timer = window.setInterval(() => setNow(Date.now()), intervalMs);
+    return () => window.clearInterval(timer);
+  }, [intervalMs]);
+
+  return now;
+}
@@ -1,70 +1,193 @@
 import { useEffect, useMemo, useRef, useState } from "react";
-import { useQueryClient } from "@tanstack/react-query";
-import type { Ambulance, Camera, Event } from "../types";
+import { useQueryClient, type QueryClient } from "@tanstack/react-query";
 
 const WS_URL = "ws://localhost:8000/ws/live";
+const textDecoder = new TextDecoder();
+const RECONNECT_MIN_MS = 500;
+const RECONNECT_MAX_MS = 10000;
 
-type LiveMessage =
-  | { type: "ambulances"; data: Ambulance[] }
-  | { type: "events"; data: Event[] }
-  | { type: "cameras"; data: Camera[] };
+type EntityType = "ambulances" | "events" | "cameras";
+
+type Entity = { id?: string; _id?: string; version?: number };
+
+// REST responses may carry the raw Mongo "_id" instead of "id"
+const entityId = (entity: Entity) => String(entity.id ?? entity._id);
+
+type LiveUpdate =
+  | { type: EntityType; op: "snapshot"; data: Entity[] }
+  | { type: EntityType; op: "delta"; upserts: Entity[]; deletes: string[] };
+
+// One frame per server flush; seq increases by one per broadcast frame.
+// Frames merged for a slow client cover from_seq..seq.
+// epoch identifies the server run; seq values are only comparable within one.
+type LiveFrame = {
+  seq: number;
+  from_seq?: number;
+  epoch?: string;
+  updates: LiveUpdate[];
+};
 
 type LiveStatus = "connecting" | "open" | "closed" | "error";
 
-export function useLiveData() {
+// Without a subscription the server sends every entity of every type
+export type LiveSubscription = {
+  types?: EntityType[];
+  bbox?: [south: number, west: number, north: number, east: number];
+  zoom?: number;
+};
+
+const ENTITY_TYPES: EntityType[] = ["ambulances", "events", "cameras"];
+
+const applySnapshot = (current: Entity[] | undefined, data: Entity[], seq: number) => {
+  // Keep entries updated by a delta newer than the snapshot
+  const newer = new Map(
+    (current ?? [])
+      .filter((entity) => (entity.version ?? 0) > seq)
+      .map((entity) => [entityId(entity), entity]),
+  );
+  const merged = data.map((entity) => newer.get(entityId(entity)) ?? entity);
+  const seen = new Set(data.map(entityId));
+  newer.forEach((entity, id) => {
+    if (!seen.has(id)) merged.push(entity);
+  });
+  return merged;
+};
+
+const applyDelta = (
+  current: Entity[] | undefined,
+  upserts: Entity[],
+  deletes: string[],
+) => {
+  const byId = new Map((current ?? []).map((entity) => [entityId(entity), entity]));
+  deletes.forEach((id) => byId.delete(id));
+  upserts.forEach((entity) => {
+    const id = entityId(entity);
+    const existing = byId.get(id);
+    if (!existing || (existing.version ?? 0) <= (entity.version ?? 0)) {
+      byId.set(id, entity);
+    }
+  });
+  return Array.from(byId.values());
+};
+
+const applyUpdate = (
+  queryClient: QueryClient,
+  update: LiveUpdate,
+  seq: number,
+  reset: boolean,
+) => {
+  if (!ENTITY_TYPES.includes(update.type)) return;
+  queryClient.setQueryData<Entity[]>([update.type], (current) =>
+    update.op === "snapshot"
+      ? applySnapshot(reset ? undefined : current, update.data, seq)
+      : applyDelta(current, update.upserts, update.deletes),
+  );
+};
+
+export function useLiveData(subscription?: LiveSubscription) {
   const queryClient = useQueryClient();
   const socketRef = useRef<WebSocket | null>(null);
+  const subscriptionRef = useRef(subscription);
   const [status, setStatus] = useState<LiveStatus>("connecting");
+  const subscriptionKey = subscription ? JSON.stringify(subscription) : null;
 
   useEffect(() => {
-    const ws = new WebSocket(WS_URL);
-    socketRef.current = ws;
+    let lastSeq = 0;
+    let epoch: string | null = null;
+    let retryMs = RECONNECT_MIN_MS;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let stopped = false;
 
-    ws.onopen = () => {
-      setStatus("open");
-      console.info("[Live] WebSocket connected");
-    };
+    const connect = () => {
+      // Resume from the last frame seen; the server falls back to snapshots.
+      // Subscribed clients get snapshots for their new view on subscribe.
+      const url =
+        epoch && lastSeq > 0 && !subscriptionRef.current
+          ? `${WS_URL}?epoch=${epoch}&last_seq=${lastSeq}`
+          : WS_URL;
+      const ws = new WebSocket(url);
+      // Frames arrive as binary UTF-8 JSON
+      ws.binaryType = "arraybuffer";
+      socketRef.current = ws;
+      setStatus("connecting");
 
-    ws.onclose = () => {
-      setStatus("closed");
-      console.info("[Live] WebSocket disconnected");
-    };
+      ws.onopen = () => {
+        setStatus("open");
+        retryMs = RECONNECT_MIN_MS;
+        console.info("[Live] WebSocket connected");
+        if (subscriptionRef.current) {
+          ws.send(
+            JSON.stringify({
+              type: "subscribe",
+              ...subscriptionRef.current,
+              epoch,
+              last_seq: lastSeq,
+            }),
+          );
+        }
+      };
 
-    ws.onerror = () => {
-      setStatus("error");
-      console.warn("[Live] WebSocket error");
-    };
+      ws.onclose = () => {
+        setStatus("closed");
+        console.info("[Live] WebSocket disconnected");
+        if (stopped) return;
+        retryTimer = setTimeout(connect, retryMs);
+        retryMs = Math.min(retryMs * 2, RECONNECT_MAX_MS);
+      };
 
-    ws.onmessage = (event) => {
-      console.log("[Live] Message received:", event.data);
-      try {
-        const message = JSON.parse(event.data) as LiveMessage;
+      ws.onerror = () => {
+        setStatus("error");
+        console.warn("[Live] WebSocket error");
+      };
 
-        if (message.type === "ambulances") {
-          // Replace the entire ambulances array
-          queryClient.setQueryData<Ambulance[]>(["ambulances"], message.data);
-          return;
-        }
+      ws.onmessage = (event) => {
+        try {
+          const text =
+            typeof event.data === "string" ? event.data : textDecoder.decode(event.data);
+          const frame = JSON.parse(text) as LiveFrame;
+          const isSnapshot = frame.updates.every((update) => update.op === "snapshot");
+          const reset = Boolean(frame.epoch && frame.epoch !== epoch);
+          if (frame.epoch) epoch = frame.epoch;
 
-        if (message.type === "events") {
-          queryClient.setQueryData<Event[]>(["events"], message.data);
-          return;
-        }
+          const firstSeq = frame.from_seq ?? frame.seq;
+
+          if (!reset && !isSnapshot && lastSeq > 0 && firstSeq > lastSeq + 1) {
+            // Missed an update: ask for fresh snapshots
+            console.info("[Live] Sequence gap, resyncing");
+            ws.send(JSON.stringify({ type: "resync" }));
+          }
+          // A new server run restarts the sequence
+          lastSeq = reset ? frame.seq : Math.max(lastSeq, frame.seq);
 
-        if (message.type === "cameras") {
-          // Normalize to _id if needed
-          queryClient.setQueryData<Camera[]>(["cameras"], message.data);
-          return;
+          frame.updates.forEach((update) =>
+            applyUpdate(queryClient, update, frame.seq, reset),
+          );
+        } catch (error) {
+          console.warn("[Live] Failed to parse message", error);
         }
-      } catch (error) {
-        console.warn("[Live] Failed to parse message", error);
-      }
+      };
     };
+
+    connect();
     return () => {
-      ws.close();
+      stopped = true;
+      clearTimeout(retryTimer);
+      socketRef.current?.close();
     };
   }, [queryClient]);
 
+  useEffect(() => {
+    subscriptionRef.current = subscription;
+    const socket = socketRef.current;
+    if (!socket || socket.readyState !== WebSocket.OPEN) return;
+    socket.send(
+      JSON.stringify(
+        subscription ? { type: "subscribe", ...subscription } : { type: "unsubscribe" },
+      ),
+    );
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [subscriptionKey]);
+
   const send = useMemo(
     () => (payload: unknown) => {
       const socket = socketRef.current;
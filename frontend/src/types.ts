@@ -1,6 +1,6 @@
 export type EventSeverity = "informational" | "emergency";
 export type EventStatus = "open" | "enroute" | "resolved";
-export type AmbulanceStatus = "idle" | "enroute" | "unavailable";
+export type AmbulanceStatus = "idle" | "enroute" | "unavailable" | "returning";
 
 export type IdValue = string | number;
 
@@ -23,6 +23,7 @@ export type Event = {
   status: EventStatus;
   created_at: string | Date;
   resolved_at?: string | Date | null;
+  version?: number;
 };
 
 export type Camera = {
@@ -31,6 +32,7 @@ export type Camera = {
   lng: number;
   latest_frame_url: string;
   name?: string | null;
+  version?: number;
 };
 
 export type Ambulance = {
@@ -41,7 +43,14 @@ export type Ambulance = {
   event_id: number | null;
   eta_seconds?: number | null;
   updated_at: string;
-  path?: Point[] | null;
+  path_encoded?: string | null;
+  path_index?: number;
+  // Timed route: per path point, meters from the start and planned seconds
+  // after departed_at (naive UTC)
+  departed_at?: string | null;
+  route_cumulative_m?: number[] | null;
+  route_times_s?: number[] | null;
+  version?: number;
 };
 
 export type Hospital = {